@@ -1,7 +1,9 @@
 import logging
+import os
 from django import forms
-from django.shortcuts import redirect, render
-from django.urls import path
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import path, reverse
 from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.views.decorators.csrf import csrf_protect
@@ -12,7 +14,7 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.status import HTTP_200_OK
 from rest_framework import status
 from .views import upload_weight_csv
-from .models import CustomUser, ExtractedImage, IProtectUser, WeightMeasurement
+from .models import CustomUser, ExtractedImage, IProtectUser, RequestProfile, SlowQuery, WeightMeasurement
 
 
 # Use the api logger
@@ -143,3 +145,67 @@ class WeightMeasurementAdmin(admin.ModelAdmin):
 
         return render(request, 'admin/csv_form.html', {'form': form})
 
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """ Profiles are created by api.profiling.ProfilingMiddleware; here they can be read, downloaded and deleted."""
+    list_display = ('created_at', 'method', 'path', 'mode', 'status_code', 'duration_ms', 'peak_memory', 'user', 'download_link')
+    list_filter = ('mode', ('created_at', admin.DateFieldListFilter))
+    search_fields = ('path', 'user__username')
+    readonly_fields = ('user', 'method', 'path', 'mode', 'status_code', 'duration_ms', 'peak_memory', 'created_at',
+                       'download_link', 'summary')
+    exclude = ('file',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = super().get_urls()
+        my_urls = [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download), name='api_requestprofile_download'),
+        ]
+        return my_urls + urls
+
+    def download(self, request, pk):
+        # The files are not under MEDIA_URL, so they are only served through here
+        if not self.has_view_permission(request):
+            return redirect('admin:index')
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        return FileResponse(profile.file.open('rb'), as_attachment=True, filename=os.path.basename(profile.file.name))
+
+    def download_link(self, obj):
+        if not obj.file:
+            return '-'
+        return format_html('<a href="{}">Download</a>', reverse('admin:api_requestprofile_download', args=[obj.pk]))
+
+    download_link.short_description = 'Profile'
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """ Slow queries are stored by api.slow_queries; here they can be read and deleted."""
+    list_display = ('created_at', 'duration_ms', 'origin', 'tables', 'short_sql', 'has_explain')
+    list_filter = ('origin', 'database', ('created_at', admin.DateFieldListFilter))
+    search_fields = ('sql', 'origin', 'tables', 'fingerprint')
+    readonly_fields = ('created_at', 'duration_ms', 'origin', 'database', 'tables', 'fingerprint', 'sql', 'params',
+                       'explain')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def short_sql(self, obj):
+        return obj.sql[:120]
+
+    short_sql.short_description = 'SQL'
+
+    def has_explain(self, obj):
+        return bool(obj.explain)
+
+    has_explain.boolean = True
+    has_explain.short_description = 'Plan'
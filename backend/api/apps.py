@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from .authentication import forget_token_user
+        post_save.connect(forget_token_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='api.authentication.forget_token_user')
+        post_delete.connect(forget_token_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='api.authentication.forget_token_user')
+
+        if getattr(settings, 'API_SERVER_TIMING', False):
+            from .timing import install_db_timer
+            connection_created.connect(install_db_timer, dispatch_uid='api.timing.install_db_timer')
+        if getattr(settings, 'API_QUERY_BUDGETS', False):
+            from .budgets import install_query_counter
+            connection_created.connect(install_query_counter, dispatch_uid='api.budgets.install_query_counter')
+        if getattr(settings, 'API_SLOW_QUERY_MS', 0):
+            from .slow_queries import install_slow_query_logger
+            connection_created.connect(install_slow_query_logger, dispatch_uid='api.slow_queries.install_slow_query_logger')
@@ -1,7 +1,33 @@
-from rest_framework.authentication import BaseAuthentication
-from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authentication import BaseAuthentication, SessionAuthentication
+from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
 import base64
-from django.contrib.auth import authenticate
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.views.decorators.csrf import csrf_exempt
+
+# How long a verified Bearer token skips the password hash check (seconds)
+BEARER_AUTH_CACHE_TIMEOUT = getattr(settings, "BEARER_AUTH_CACHE_TIMEOUT", 300)
+
+# Lifetime of tokens issued by TokenView (seconds)
+ACCESS_TOKEN_MAX_AGE = getattr(settings, "ACCESS_TOKEN_MAX_AGE", 15 * 60)
+ACCESS_TOKEN_SALT = "api.authentication.access_token"
+
+
+def _token_cache_key(token):
+    """Cache key for a token; the raw token (username:password) is never stored."""
+    return "bearer_auth:" + salted_hmac("api.authentication.token", token).hexdigest()
+
+
+def _password_fingerprint(user):
+    """Changes whenever the user's password changes, which invalidates cached tokens."""
+    return salted_hmac("api.authentication.password", user.password).hexdigest()
+
 
 class BearerAuthentication(BaseAuthentication):
     def authenticate(self, request):
@@ -10,6 +36,17 @@ class BearerAuthentication(BaseAuthentication):
             return None  # Continue with other authentication methods
 
         token = auth_header.split(' ', 1)[1]
+        cache_key = _token_cache_key(token)
+
+        # Previously verified token: skip the (slow) password hashing
+        cached = cache.get(cache_key)
+        if cached is not None:
+            user_id, fingerprint = cached
+            user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+            if user is not None and constant_time_compare(fingerprint, _password_fingerprint(user)):
+                return user, None
+            cache.delete(cache_key)
+
         try:
             decoded = base64.b64decode(token).decode('utf-8')
             username, password = decoded.split(':', 1)
@@ -19,4 +56,106 @@ class BearerAuthentication(BaseAuthentication):
         user = authenticate(username=username, password=password)
         if user is None:
             raise AuthenticationFailed("Invalid username/password")
+
+        cache.set(cache_key, (user.pk, _password_fingerprint(user)), BEARER_AUTH_CACHE_TIMEOUT)
         return user, None
+
+
+# How long the user behind access tokens is cached (seconds). Saving or deleting the
+# user clears the entry, but only in the cache this process uses: with the per-process
+# locmem cache other workers keep their copy until it expires. Changes that bypass
+# save() (queryset.update) always take this long.
+ACCESS_TOKEN_USER_CACHE_TIMEOUT = getattr(settings, "ACCESS_TOKEN_USER_CACHE_TIMEOUT", 60)
+
+
+def _token_user_cache_key(user_id):
+    return f"access_token_user:{user_id}"
+
+
+def forget_token_user(sender, instance, **kwargs):
+    """post_save/post_delete receiver for the user model, connected in ApiConfig.ready."""
+    cache.delete(_token_user_cache_key(instance.pk))
+
+
+def _token_user(user_id):
+    """The user with this id, cached as a whole (is_staff, is_superuser, ... included); None when it doesn't exist."""
+    key = _token_user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, ACCESS_TOKEN_USER_CACHE_TIMEOUT)
+    return user
+
+
+def issue_access_token(user):
+    """Signed, timestamped token carrying the user id and a fingerprint of the password."""
+    payload = {"uid": user.pk, "fp": _password_fingerprint(user)}
+    return signing.dumps(payload, salt=ACCESS_TOKEN_SALT)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authorization: Token <access token from /api/token/>
+
+    The signature and age are checked without touching the database. The user
+    comes from a short-lived cache of the user table (see _token_user): a
+    password change, deactivation or role change applies at once in a shared
+    cache (CACHE_BACKEND=file), and within ACCESS_TOKEN_USER_CACHE_TIMEOUT on
+    the other workers when every process has its own locmem cache.
+    """
+    keyword = "Token"
+
+    def authenticate(self, request):
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith(self.keyword + " "):
+            return None
+
+        token = auth_header.split(' ', 1)[1]
+        try:
+            payload = signing.loads(token, salt=ACCESS_TOKEN_SALT, max_age=ACCESS_TOKEN_MAX_AGE)
+        except signing.SignatureExpired:
+            raise AuthenticationFailed("Token expired")
+        except signing.BadSignature:
+            raise AuthenticationFailed("Invalid token")
+
+        user = _token_user(payload.get("uid"))
+        if user is None:
+            raise AuthenticationFailed("Token revoked")
+        if not user.is_active or not constant_time_compare(payload.get("fp", ""), _password_fingerprint(user)):
+            raise AuthenticationFailed("Token revoked")
+        return user, payload
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+def async_authentication(view):
+    """
+    Authentication for the plain async views, matching their DRF counterparts:
+    an `Authorization: Token` header (SignedTokenAuthentication) or the session,
+    which then has to pass the same CSRF check as DRF's SessionAuthentication.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await sync_to_async(SignedTokenAuthentication().authenticate)(request)
+            if result is not None:
+                user = result[0]
+            else:
+                user = await request.auser()
+                if user.is_authenticated:
+                    await sync_to_async(SessionAuthentication().enforce_csrf)(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({"error": str(e.detail)}, status=401)
+        except PermissionDenied as e:
+            return JsonResponse({"error": str(e.detail)}, status=403)
+
+        if not user.is_authenticated:
+            return JsonResponse({"error": "Authentication credentials were not provided."}, status=401)
+        request.user = user
+        return await view(request, *args, **kwargs)
+
+    # Token clients send no CSRF token, the session path is checked above
+    return csrf_exempt(wrapper)
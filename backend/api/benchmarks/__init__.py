@@ -0,0 +1,11 @@
+"""
+Synthetic-data benchmarks for the import and query paths.
+
+    python manage.py benchmark --size 1k
+    python manage.py benchmark --size 100k --only cross_reference minmaxavg --output bench.json
+    python manage.py benchmark --size 100k --compare bench.json
+
+Against PostgreSQL with the normal settings, or locally against SQLite with
+DATABASE_ENGINE=sqlite (run `migrate` first). Nothing is left behind in the
+database: every benchmark runs in a transaction that is rolled back.
+"""
@@ -0,0 +1,94 @@
+"""
+Synthetic input files in the formats the import endpoints accept.
+
+Every generator takes a `random.Random` so the same seed gives the same
+file, and writes to a path row by row, so 1M row files don't have to fit
+in memory.
+"""
+
+import base64
+import datetime
+
+from openpyxl import Workbook
+
+from api.upload_handlers import WEIGHT_CSV_METADATA_LINES
+
+JPEG_MAGIC = b'\xff\xd8\xff\xe0'
+
+WEIGHT_CSV_HEADER = [
+    'Date - Time', 'Body weight (kg)', 'Bone mass (%)', 'Body fat (%)',
+    'Body water (%)', 'Muscle mass (%)', 'BMI',
+]
+
+IDENTITY_HEADER = ['username', 'email', 'display_name', 'department']
+
+DEPARTMENTS = ['ICT', 'HR', 'Finance', 'Operations', 'Security', 'Facilities']
+
+# Usernames of each source start at rows * offset / 8, so the sources partly overlap
+SOURCE_OFFSETS = {'users': 0, 'mail_dist_list': 2, 'ad_group': 3}
+
+
+def photo_export_xml(path, count, rng, photo_size=8 * 1024):
+    """XML photo export with `count` base64 encoded photos of `photo_size` bytes."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<export>\n')
+        for i in range(count):
+            image = JPEG_MAGIC + rng.randbytes(photo_size - len(JPEG_MAGIC))
+            f.write(
+                '<koppeling_medewerkers_fotos>'
+                f'<Medewerker>{100000 + i}</Medewerker>'
+                f'<Afbeelding>{base64.b64encode(image).decode()}</Afbeelding>'
+                '</koppeling_medewerkers_fotos>\n'
+            )
+        f.write('</export>\n')
+
+
+def weight_rows(rows, rng, start=datetime.datetime(1900, 1, 1, 7, 30)):
+    """One measurement per day from `start`: (datetime, weight, bone, fat, water, muscle, bmi)."""
+    weight = 85.0
+    for i in range(rows):
+        weight = min(max(weight + rng.uniform(-0.4, 0.4), 60.0), 120.0)
+        yield (
+            start + datetime.timedelta(days=i),
+            round(weight, 2),
+            round(rng.uniform(3.5, 4.5), 2),
+            round(rng.uniform(15.0, 30.0), 2),
+            round(rng.uniform(50.0, 60.0), 2),
+            round(rng.uniform(35.0, 45.0), 2),
+            round(weight / 1.85 ** 2, 2),
+        )
+
+
+def weight_csv(path, rows, rng):
+    """Weight scale export: metadata lines, then a ';' separated table."""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('Weight scale export\n')
+        for i in range(1, WEIGHT_CSV_METADATA_LINES):
+            f.write(f'Metadata line {i}\n')
+        f.write(';'.join(WEIGHT_CSV_HEADER) + '\n')
+        for dt, *values in weight_rows(rows, rng):
+            f.write(dt.strftime('%m/%d/%Y - %H:%M') + ';' + ';'.join(str(value) for value in values) + '\n')
+
+
+def identity_rows(rows, rng, source='users'):
+    """(username, email, display_name, department) rows; usernames use mixed case."""
+    offset = rows * SOURCE_OFFSETS.get(source, 0) // 8
+    for i in range(offset, offset + rows):
+        username = f'User{i}' if rng.random() < 0.3 else f'user{i}'
+        yield username, f'user{i}@example.com', f'User {i}', rng.choice(DEPARTMENTS)
+
+
+def identity_csv(path, rows, rng, source='users'):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(','.join(IDENTITY_HEADER) + '\n')
+        for row in identity_rows(rows, rng, source):
+            f.write(','.join(row) + '\n')
+
+
+def identity_xlsx(path, rows, rng, source='users'):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(IDENTITY_HEADER)
+    for row in identity_rows(rows, rng, source):
+        sheet.append(row)
+    workbook.save(path)
@@ -0,0 +1,298 @@
+"""
+Benchmarks of the import and query paths, run by `manage.py benchmark`.
+
+Each benchmark seeds what it needs and runs inside a transaction that is
+rolled back afterwards, and every timed run of an import is rolled back to a
+savepoint, so all runs start from the same state and the database is left
+as it was. Uploaded files go to a temporary MEDIA_ROOT.
+
+A benchmark is a function that takes a Context, does its (untimed) setup and
+returns `prepare`, called before every run, and `run`, the timed part, which
+gets what `prepare` returned.
+"""
+
+import gc
+import os
+import platform
+import random
+import statistics
+import tempfile
+import tracemalloc
+import uuid
+from time import perf_counter
+
+import django
+from django.db import connection, transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import CustomUser, ExtractedImage, WeightMeasurement
+from api.views import get_minmaxavg, list_uploaded_fotos, upload_fotos, upload_weight_csv, weight_measurement_list
+from identity_checker.cross_reference import cross_reference, cross_reference_summary
+from identity_checker.models import Application, Identity, IdentitySource
+from identity_checker.parsers import parse_file
+from identity_checker.views import CrossReferenceView, IdentityListView, UploadView
+
+from . import generators
+
+SIZES = {'1k': 1_000, '100k': 100_000, '1M': 1_000_000}
+
+# Photo exports are far bigger per row than the CSV files: 1M rows means 10k photos
+PHOTOS_PER_ROW = 1 / 100
+
+SEED_BATCH_SIZE = 5000
+APPLICATION = Application.IPROTECT
+
+
+class Context:
+    def __init__(self, rows, seed, workdir):
+        self.rows = rows
+        # What one run actually processes, for rows_per_s; benchmarks that scale `rows` set it
+        self.processed_rows = rows
+        self.rng = random.Random(seed)
+        self.workdir = workdir
+        self.factory = APIRequestFactory()
+        self.user = CustomUser.objects.create(username=f'benchmark-{uuid.uuid4().hex[:8]}', role='A')
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def get(self, view, url, **kwargs):
+        request = self.factory.get(url, **kwargs)
+        force_authenticate(request, user=self.user)
+        return lambda: view(request)
+
+    def post_file(self, url, path, **data):
+        with open(path, 'rb') as f:
+            request = self.factory.post(url, {'file': f, **data}, format='multipart')
+        force_authenticate(request, user=self.user)
+        return request
+
+
+def _render(response):
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.status_code}: {response.content[:500]!r}")
+    return response
+
+
+def _seed_identities(ctx):
+    for source in IdentitySource.values:
+        rows = generators.identity_rows(ctx.rows, ctx.rng, source)
+        Identity.objects.bulk_create(
+            (Identity(application=APPLICATION, source=source, username=username, email=email,
+                      display_name=display_name, department=department)
+             for username, email, display_name, department in rows),
+            batch_size=SEED_BATCH_SIZE,
+        )
+
+
+def _seed_weight(ctx):
+    WeightMeasurement.objects.bulk_create(
+        (WeightMeasurement(user=ctx.user, date=dt.date(), weight_kg=weight, bone_mass=bone, body_fat=fat,
+                           body_water=water, muscle_mass=muscle, bmi=bmi)
+         for dt, weight, bone, fat, water, muscle, bmi in generators.weight_rows(ctx.rows, ctx.rng)),
+        batch_size=SEED_BATCH_SIZE,
+    )
+
+
+def _seed_images(ctx):
+    ExtractedImage.objects.bulk_create(
+        (ExtractedImage(user=ctx.user, medewerker_number=str(i), image=f'benchmark/{i}.jpg',
+                        original_filename=f'{i}.jpg', image_type='jpg', image_size=8192)
+         for i in range(ctx.rows)),
+        batch_size=SEED_BATCH_SIZE,
+    )
+
+
+# --- imports ---
+
+def bench_upload_fotos(ctx):
+    path = ctx.path('photos.xml')
+    ctx.processed_rows = max(int(ctx.rows * PHOTOS_PER_ROW), 1)
+    generators.photo_export_xml(path, ctx.processed_rows, ctx.rng)
+    return (
+        lambda: ctx.post_file('/api/upload-fotos/', path),
+        lambda request: _render(upload_fotos(request)),
+    )
+
+
+def bench_upload_weight_csv(ctx):
+    path = ctx.path('weight.csv')
+    generators.weight_csv(path, ctx.rows, ctx.rng)
+    return (
+        lambda: ctx.post_file('/api/upload-csv/', path),
+        lambda request: _render(upload_weight_csv(request)),
+    )
+
+
+def _bench_parse_file(ctx, name, generate):
+    path = ctx.path(name)
+    generate(path, ctx.rows, ctx.rng)
+    return (lambda: open(path, 'rb')), (lambda f: parse_file(f, name))
+
+
+def bench_parse_file_csv(ctx):
+    return _bench_parse_file(ctx, 'identities.csv', generators.identity_csv)
+
+
+def bench_parse_file_xlsx(ctx):
+    return _bench_parse_file(ctx, 'identities.xlsx', generators.identity_xlsx)
+
+
+def bench_identity_upload(ctx):
+    """UploadView in diff mode, on top of the same source seeded with a different file."""
+    _seed_identities(ctx)
+    path = ctx.path('identities.csv')
+    generators.identity_csv(path, ctx.rows, ctx.rng)
+    view = UploadView.as_view()
+    data = {'application': APPLICATION, 'source': IdentitySource.USERS, 'mode': 'diff'}
+    return (
+        lambda: ctx.post_file('/api/identity-checker/upload/', path, **data),
+        lambda request: _render(view(request)),
+    )
+
+
+# --- queries ---
+
+def bench_cross_reference(ctx):
+    _seed_identities(ctx)
+    return (lambda: None), (lambda _: cross_reference(APPLICATION))
+
+
+def bench_cross_reference_summary(ctx):
+    _seed_identities(ctx)
+    return (lambda: None), (lambda _: cross_reference_summary(APPLICATION))
+
+
+def bench_cross_reference_category(ctx):
+    _seed_identities(ctx)
+    call = ctx.get(CrossReferenceView.as_view(), '/api/identity-checker/cross-reference/',
+                   data={'application': APPLICATION, 'category': 'only_in_users'})
+    return (lambda: None), (lambda _: _render(call()))
+
+
+def bench_identities_list(ctx):
+    _seed_identities(ctx)
+    call = ctx.get(IdentityListView.as_view(), '/api/identity-checker/identities/',
+                   data={'application': APPLICATION, 'source': IdentitySource.USERS})
+    return (lambda: None), (lambda _: _render(call()))
+
+
+def bench_minmaxavg(ctx):
+    _seed_weight(ctx)
+    call = ctx.get(get_minmaxavg, '/api/minmaxavg/')
+    return (lambda: None), (lambda _: _render(call()))
+
+
+def bench_weight_data(ctx):
+    _seed_weight(ctx)
+    call = ctx.get(weight_measurement_list, '/api/weight-data/', data={'ordering': '-date'})
+    return (lambda: None), (lambda _: _render(call()))
+
+
+def bench_list_uploaded_fotos(ctx):
+    _seed_images(ctx)
+    call = ctx.get(list_uploaded_fotos, '/api/list_uploaded_fotos/')
+    return (lambda: None), (lambda _: _render(call()))
+
+
+BENCHMARKS = {
+    'upload_fotos': bench_upload_fotos,
+    'upload_weight_csv': bench_upload_weight_csv,
+    'parse_file_csv': bench_parse_file_csv,
+    'parse_file_xlsx': bench_parse_file_xlsx,
+    'identity_upload': bench_identity_upload,
+    'cross_reference': bench_cross_reference,
+    'cross_reference_summary': bench_cross_reference_summary,
+    'cross_reference_category': bench_cross_reference_category,
+    'identities_list': bench_identities_list,
+    'minmaxavg': bench_minmaxavg,
+    'weight_data': bench_weight_data,
+    'list_uploaded_fotos': bench_list_uploaded_fotos,
+}
+
+
+def _timed(prepare, run):
+    """One run, rolled back to a savepoint: (seconds, number of queries)."""
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with transaction.atomic():
+        arg = prepare()
+        gc.collect()
+        gc.disable()
+        try:
+            with connection.execute_wrapper(count):
+                start = perf_counter()
+                run(arg)
+                elapsed = perf_counter() - start
+        finally:
+            gc.enable()
+            if hasattr(arg, 'close'):
+                arg.close()
+        transaction.set_rollback(True)
+    return elapsed, len(queries)
+
+
+def _peak_memory(prepare, run):
+    """Peak of Python allocations (tracemalloc) during one run, in bytes."""
+    with transaction.atomic():
+        arg = prepare()
+        tracemalloc.start()
+        try:
+            run(arg)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            if hasattr(arg, 'close'):
+                arg.close()
+        transaction.set_rollback(True)
+    return peak
+
+
+def run_benchmark(name, size, repeat=5, warmup=1, seed=0, memory=True):
+    rows = SIZES[size]
+    with tempfile.TemporaryDirectory() as workdir, \
+            override_settings(MEDIA_ROOT=os.path.join(workdir, 'media'), ALLOWED_HOSTS=['testserver']), \
+            transaction.atomic():
+        ctx = Context(rows, seed, workdir)
+        setup_start = perf_counter()
+        prepare, run = BENCHMARKS[name](ctx)
+        setup = perf_counter() - setup_start
+
+        for _ in range(warmup):
+            _timed(prepare, run)
+        runs = [_timed(prepare, run) for _ in range(repeat)]
+        peak = _peak_memory(prepare, run) if memory else None
+
+        transaction.set_rollback(True)
+
+    timings = [seconds for seconds, _ in runs]
+    median = statistics.median(timings)
+    return {
+        'name': name,
+        'size': size,
+        'rows': ctx.processed_rows,
+        'setup_s': round(setup, 3),
+        'runs_s': [round(seconds, 6) for seconds in timings],
+        'min_s': min(timings),
+        'median_s': median,
+        'max_s': max(timings),
+        'rows_per_s': ctx.processed_rows / median if median else None,
+        'queries': runs[-1][1],
+        'peak_bytes': peak,
+    }
+
+
+def environment():
+    return {
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.machine(),
+    }
@@ -0,0 +1,185 @@
+"""
+Query-count and latency budgets per URL route.
+
+BUDGETS maps a URL route (as in the metrics labels, e.g. 'api/minmaxavg/') to
+the number of queries and milliseconds one request may take, authentication
+included. The tests in api/tests.py and identity_checker/tests.py request
+every budgeted route on seeded data and fail when a route goes over its
+query budget:
+
+    with measure() as usage:
+        response = self.client.get('/api/minmaxavg/')
+    self.assertEqual(violations('api/minmaxavg/', usage, latency=False), [])
+
+Latency is only checked in staging: with API_QUERY_BUDGETS = True
+QueryBudgetMiddleware measures every request to a budgeted route and logs the
+ones over budget to the 'api' logger. Raise a budget in the same commit as the
+change that needs it, so it is reviewed.
+"""
+
+import json
+import logging
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .metrics import BUDGET_VIOLATIONS, registry
+
+logger = logging.getLogger('api')
+
+Budget = namedtuple('Budget', ['queries', 'ms'])
+
+BUDGETS = {
+    'api/list_uploaded_fotos/': Budget(queries=5, ms=250),
+    'api/weight-data/': Budget(queries=5, ms=250),
+    'api/latest-datetime/': Budget(queries=3, ms=100),
+    'api/minmaxavg/': Budget(queries=4, ms=250),
+    'api/userinfo/': Budget(queries=2, ms=100),
+    'api/identity-checker/identities/': Budget(queries=3, ms=250),
+    'api/identity-checker/cross-reference/': Budget(queries=5, ms=1000),
+    'api/identity-checker/upload-logs/': Budget(queries=3, ms=100),
+    'api/identity-checker/snapshots/': Budget(queries=3, ms=100),
+    'api/identity-checker/status/': Budget(queries=4, ms=100),
+}
+
+
+class Usage:
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    @property
+    def ms(self):
+        return self.seconds * 1000
+
+
+# Usage of the measured block or request, None when not measuring
+_usage = ContextVar('api_budget_usage', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """Database execute wrapper, see install_query_counter."""
+    usage = _usage.get()
+    if usage is not None:
+        usage.queries += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver, connected in ApiConfig.ready when API_QUERY_BUDGETS is on."""
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+@contextmanager
+def measure():
+    """Count the queries and time of the block (tests; the middleware measures requests itself)."""
+    usage = Usage()
+    # Already counted when the middleware's counter is installed on the connection
+    installed = count_queries in connection.execute_wrappers
+    token = _usage.set(usage)
+    start = perf_counter()
+    try:
+        with nullcontext() if installed else connection.execute_wrapper(count_queries):
+            yield usage
+    finally:
+        usage.seconds = perf_counter() - start
+        _usage.reset(token)
+
+
+def exceeded(budget, usage):
+    """The parts of `budget` that `usage` goes over: 'queries' and/or 'latency'."""
+    kinds = []
+    if usage.queries > budget.queries:
+        kinds.append('queries')
+    if usage.ms > budget.ms:
+        kinds.append('latency')
+    return kinds
+
+
+def violations(route, usage, latency=True):
+    """
+    What `usage` exceeds of the budget of `route`, as messages (empty when within budget).
+    latency=False only checks the number of queries, for tests: wall-clock time on a
+    shared CI runner says little.
+    """
+    budget = BUDGETS[route]
+    messages = {
+        'queries': f"{route}: {usage.queries} queries, budget {budget.queries}",
+        'latency': f"{route}: {usage.ms:.0f} ms, budget {budget.ms}",
+    }
+    return [messages[kind] for kind in exceeded(budget, usage) if latency or kind != 'latency']
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match else None
+
+
+class QueryBudgetMiddleware:
+    """Log requests over their budget; see the module docstring. Removed from the stack when the setting is off."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_QUERY_BUDGETS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        usage = Usage()
+        token = _usage.set(usage)
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _usage.reset(token)
+        usage.seconds = perf_counter() - start
+        self.check(request, response, usage)
+        return response
+
+    async def __acall__(self, request):
+        usage = Usage()
+        token = _usage.set(usage)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _usage.reset(token)
+        usage.seconds = perf_counter() - start
+        self.check(request, response, usage)
+        return response
+
+    def check(self, request, response, usage):
+        route = _route(request)
+        if route not in BUDGETS:
+            return
+        budget = BUDGETS[route]
+        over = exceeded(budget, usage)
+        if not over:
+            return
+
+        for kind in over:
+            BUDGET_VIOLATIONS.inc(route=route, kind=kind)
+        registry.flush()
+        log_record = {
+            'route': route,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': usage.queries,
+            'budget_queries': budget.queries,
+            'ms': round(usage.ms, 1),
+            'budget_ms': budget.ms,
+        }
+        logger.warning('over budget %s', json.dumps(log_record), extra={'budget': log_record})
@@ -0,0 +1,58 @@
+"""
+Conditional GET for endpoints the frontends poll.
+
+A view computes an ETag from a cheap change marker (row count, max id and
+last update time, an upload generation counter, ...) before it queries or
+serializes anything. When the client already has that version (If-None-Match)
+the view returns 304 straight away:
+
+    etag = make_etag(request, *queryset_marker(queryset))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    ...
+    return set_etag(Response(data), etag)
+"""
+
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+
+def queryset_marker(queryset):
+    """
+    (count, max id, max updated_at) of a queryset; changes whenever a row is added,
+    removed or saved. Needs an auto_now `updated_at` field; queryset.update() does not
+    set it, so pass updated_at=timezone.now() there.
+    """
+    marker = queryset.aggregate(count=Count('id'), last=Max('id'), updated=Max('updated_at'))
+    return marker['count'], marker['last'], marker['updated']
+
+
+def make_etag(request, *markers):
+    """ETag for the requesting user, the full URL, the negotiated format and the markers."""
+    parts = (
+        getattr(request.user, 'pk', None),
+        request.get_full_path(),
+        getattr(request, 'accepted_media_type', ''),
+        *markers,
+    )
+    raw = '|'.join(str(part) for part in parts)
+    return '"%s"' % hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def set_etag(response, etag):
+    response['ETag'] = etag
+    # Always revalidate; responses differ per user and per negotiated format
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+    return response
+
+
+def not_modified(request, etag):
+    """A 304 response if the client's If-None-Match matches `etag`, else None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        set_etag(response, etag)
+    return response
@@ -0,0 +1,62 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from api.models import CustomUser
+
+
+class Command(BaseCommand):
+    """
+        Benchmark request latency with the configured connection settings against a new connection per request.
+        Run it once with DATABASE_POOL=True and once without to compare pooling with persistent connections.
+
+        python3 manage.py bench_connections --username admin --requests 500
+    """
+    help = 'Compare per-request latency with and without database connection reuse.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='Existing user to log in as')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per configuration')
+        parser.add_argument('--path', default='/api/latest-datetime/', help='Session-authenticated URL to request')
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        configured = connection.settings_dict['CONN_MAX_AGE']
+        pooled = bool(connection.settings_dict.get('OPTIONS', {}).get('pool'))
+        label = 'pool' if pooled else f'CONN_MAX_AGE={configured}'
+
+        self.stdout.write(f"{'configuration':<22}{'connections':>12}{'ms/req':>10}")
+        for name, max_age in ((label, configured), ('new connection/req', 0)):
+            if name != label and pooled:
+                continue  # the pool cannot be switched off at runtime
+            self._run(name, max_age, user, options)
+
+        connection.settings_dict['CONN_MAX_AGE'] = configured
+
+    def _run(self, name, max_age, user, options):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        opened = []
+
+        def count(sender, **kwargs):
+            opened.append(1)
+
+        connection_created.connect(count)
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                client = Client()
+                client.force_login(user)
+                start = time.perf_counter()
+                for _ in range(options['requests']):
+                    client.get(options['path'])
+                    close_old_connections()  # the test client skips this on request_finished
+                elapsed = time.perf_counter() - start
+        finally:
+            connection_created.disconnect(count)
+
+        self.stdout.write(f"{name:<22}{len(opened):>12}{elapsed / options['requests'] * 1000:>10.2f}")
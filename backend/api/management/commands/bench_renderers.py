@@ -0,0 +1,62 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from api import renderers
+
+
+class Command(BaseCommand):
+    """
+        Benchmark encode time and response size of the API renderers on payloads shaped like
+        weight-data/ (numeric series) and cross-reference/ (lists of identities).
+
+        python3 manage.py bench_renderers --rows 10000
+    """
+    help = 'Compare encode time and bytes of the JSON, columnar JSON and MessagePack renderers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per payload')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per renderer, the best one is reported')
+
+    def handle(self, *args, **options):
+        n = options['rows']
+        start = datetime.date(2020, 1, 1)
+        payloads = {
+            'weight-data': {
+                'count': n, 'next': None, 'previous': None,
+                'results': [
+                    {'user': 1, 'date': (start + datetime.timedelta(days=i)).isoformat(), 'weight_kg': '80.50',
+                     'bone_mass': '4.10', 'body_fat': '20.30', 'body_water': '55.00', 'muscle_mass': '40.20', 'bmi': '24.10'}
+                    for i in range(n)
+                ],
+            },
+            'cross-reference': {
+                'only_in_users': [
+                    {'username': f'user{i}', 'email': f'user{i}@example.com', 'display_name': f'User {i}',
+                     'department': 'ICT', 'in_users': True, 'in_mail_dist': False, 'in_ad_group': False}
+                    for i in range(n)
+                ],
+            },
+        }
+
+        candidates = [
+            ('JSONRenderer', JSONRenderer()),
+            ('FastJSONRenderer', renderers.FastJSONRenderer()),
+            ('ColumnarJSONRenderer', renderers.ColumnarJSONRenderer()),
+        ]
+        if renderers.msgpack is not None:
+            candidates.append(('MessagePackRenderer', renderers.MessagePackRenderer()))
+        if renderers.orjson is None:
+            self.stdout.write('orjson is not installed: FastJSONRenderer uses the stdlib encoder')
+
+        for name, data in payloads.items():
+            self.stdout.write(f"\n{name} ({n} rows)")
+            self.stdout.write(f"{'renderer':<24}{'ms':>10}{'bytes':>12}")
+            for label, renderer in candidates:
+                best, body = None, b''
+                for _ in range(options['repeat']):
+                    t0 = time.perf_counter()
+                    body = renderer.render(data, renderer.media_type, {})
+                    elapsed = time.perf_counter() - t0
+                    best = elapsed if best is None else min(best, elapsed)
+                self.stdout.write(f"{label:<24}{best * 1000:>10.2f}{len(body):>12}")
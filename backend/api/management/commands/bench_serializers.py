@@ -0,0 +1,85 @@
+import datetime
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from api.models import CustomUser, ExtractedImage, WeightMeasurement
+from api.serializers import (ExtractedImageSerializer, ExtractedImageReadSerializer,
+                             WeightMeasurementsSerializer, WeightMeasurementReadSerializer)
+
+
+class Command(BaseCommand):
+    """
+        Benchmark serialization cost per row of the ModelSerializers against the values()-based
+        read serializers used by the list endpoints. Works on in-memory data, no database needed.
+
+        python3 manage.py bench_serializers --rows 10000
+    """
+    help = 'Compare µs/row of ModelSerializer and the lightweight read serializers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per page to serialize')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per serializer, the best one is reported')
+
+    def handle(self, *args, **options):
+        n = options['rows']
+        now = timezone.now()
+        user = CustomUser(id=1, username='bench', role='U')
+        request = RequestFactory().get('/api/list_uploaded_fotos/')
+
+        images = [
+            ExtractedImage(
+                id=i, user=user, medewerker_number=str(i), image=f"images_bench_2025-01-01/bench_{i}.jpg",
+                original_filename=f"bench_{i}.jpg", image_type='jpg', image_size=1000 + i, created_at=now,
+            )
+            for i in range(n)
+        ]
+        image_rows = [
+            {
+                'id': img.id, 'user__username': user.username, 'user__role': user.role,
+                'medewerker_number': img.medewerker_number, 'image': img.image.name,
+                'original_filename': img.original_filename, 'image_type': img.image_type,
+                'image_size': img.image_size, 'created_at': img.created_at,
+            }
+            for img in images
+        ]
+        measurements = [
+            WeightMeasurement(
+                user=user, date=datetime.date(2020, 1, 1) + datetime.timedelta(days=i),
+                weight_kg=Decimal('80.50'), bone_mass=Decimal('4.10'), body_fat=Decimal('20.30'),
+                body_water=Decimal('55.00'), muscle_mass=Decimal('40.20'), bmi=Decimal('24.10'),
+            )
+            for i in range(n)
+        ]
+        measurement_rows = [
+            {field: getattr(m, 'user_id' if field == 'user' else field) for field in WeightMeasurementReadSerializer.values_fields}
+            for m in measurements
+        ]
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            cases = [
+                ('ExtractedImage',
+                 lambda: ExtractedImageSerializer(images, many=True, context={'request': request}).data,
+                 lambda: ExtractedImageReadSerializer(request).serialize(image_rows)),
+                ('WeightMeasurement',
+                 lambda: WeightMeasurementsSerializer(measurements, many=True).data,
+                 lambda: WeightMeasurementReadSerializer().serialize(measurement_rows)),
+            ]
+
+            self.stdout.write(f"{'serializer':<20}{'model µs/row':>14}{'read µs/row':>14}{'speedup':>10}")
+            for name, model_serializer, read_serializer in cases:
+                before, expected = self._best(model_serializer, options['repeat'])
+                after, result = self._best(read_serializer, options['repeat'])
+                if [dict(row) for row in expected] != result:
+                    self.stderr.write(f"{name}: read serializer output differs from the ModelSerializer")
+                self.stdout.write(f"{name:<20}{before / n * 1e6:>14.2f}{after / n * 1e6:>14.2f}{before / after:>9.1f}x")
+
+    def _best(self, func, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,51 @@
+import time
+import uuid
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from api.models import CustomUser
+
+
+class Command(BaseCommand):
+    """
+        Benchmark database queries and latency per authenticated request for each session backend.
+        A temporary user is created inside a transaction that is rolled back afterwards.
+
+        python3 manage.py bench_sessions --requests 200
+    """
+    help = 'Compare per-request DB queries for the db, cached_db and signed_cookies session backends.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Requests per session backend')
+        parser.add_argument('--path', default='/api/userinfo/', help='Session-authenticated URL to request')
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        path = options['path']
+
+        self.stdout.write(f"{'backend':<16}{'queries/req':>14}{'session q/req':>16}{'ms/req':>10}")
+        with transaction.atomic():
+            user = CustomUser.objects.create_user(username=f"bench_{uuid.uuid4().hex[:8]}", password=uuid.uuid4().hex, role='U')
+
+            for name, engine in settings.SESSION_ENGINES.items():
+                with override_settings(SESSION_ENGINE=engine, ALLOWED_HOSTS=['testserver']):
+                    client = Client()
+                    client.force_login(user)
+                    client.get(path)  # warm up (first cached_db read comes from the DB)
+
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        for _ in range(n):
+                            response = client.get(path)
+                        elapsed = time.perf_counter() - start
+
+                    if response.status_code != 200:
+                        self.stderr.write(f"{name}: {path} returned {response.status_code}")
+                    session_queries = sum('django_session' in q['sql'] for q in ctx.captured_queries)
+                    self.stdout.write(
+                        f"{name:<16}{len(ctx) / n:>14.2f}{session_queries / n:>16.2f}{elapsed / n * 1000:>10.2f}"
+                    )
+
+            transaction.set_rollback(True)
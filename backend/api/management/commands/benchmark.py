@@ -0,0 +1,72 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmarks.suite import BENCHMARKS, SIZES, environment, run_benchmark
+
+
+class Command(BaseCommand):
+    """
+        Run the synthetic-data benchmarks (api/benchmarks) and print median time, throughput,
+        query count and peak memory per benchmark.
+
+        python3 manage.py benchmark --size 100k --output bench.json
+        python3 manage.py benchmark --size 100k --compare bench.json --tolerance 1.25
+
+        With --compare the command fails when a median is more than `tolerance` times the
+        baseline, so it can gate a deploy.
+    """
+    help = 'Benchmark the import and query paths with generated data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=list(SIZES), default='1k', help='Rows per generated data set')
+        parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Benchmarks to run (default: all)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed runs before the timed ones')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the data generators')
+        parser.add_argument('--no-memory', action='store_true', help='Skip the (slower) tracemalloc run')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+        parser.add_argument('--tolerance', type=float, default=1.25, help='Allowed median slowdown for --compare')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        baseline = self.load_baseline(options['compare']) if options['compare'] else {}
+
+        env = environment()
+        self.stdout.write(f"{env['database']}, Python {env['python']}, Django {env['django']}, size {options['size']}")
+        self.stdout.write(f"{'benchmark':<26}{'median s':>10}{'min s':>10}{'rows/s':>12}{'queries':>9}{'peak MB':>9}{'baseline':>10}")
+
+        results = []
+        regressions = []
+        for name in options['only'] or BENCHMARKS:
+            result = run_benchmark(
+                name, options['size'], repeat=options['repeat'], warmup=options['warmup'],
+                seed=options['seed'], memory=not options['no_memory'],
+            )
+            results.append(result)
+
+            previous = baseline.get((name, options['size']))
+            ratio = result['median_s'] / previous['median_s'] if previous and previous['median_s'] else None
+            if ratio is not None and ratio > options['tolerance']:
+                regressions.append(f"{name}: {ratio:.2f}x the baseline median")
+
+            peak = f"{result['peak_bytes'] / 2**20:.1f}" if result['peak_bytes'] is not None else '-'
+            self.stdout.write(
+                f"{name:<26}{result['median_s']:>10.4f}{result['min_s']:>10.4f}{result['rows_per_s'] or 0:>12.0f}"
+                f"{result['queries']:>9}{peak:>9}{f'{ratio:.2f}x' if ratio is not None else '-':>10}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'environment': env, 'seed': options['seed'], 'results': results}, f, indent=2)
+
+        if regressions:
+            raise CommandError('Slower than the baseline:\n' + '\n'.join(regressions))
+
+    def load_baseline(self, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read baseline {path}: {e}")
+        return {(result['name'], result['size']): result for result in data['results']}
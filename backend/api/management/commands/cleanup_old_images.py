@@ -4,7 +4,8 @@ import logging
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
-from api.models import ExtractedImage
+from api.metrics import CLEANUP_DELETED, registry
+from api.models import ChunkedUpload, ExtractedImage
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,15 @@ class Command(BaseCommand):
     help = 'Delete all user image folders (and DB records) older than 2 days.'
 
     def handle(self, *args, **options):
-        cutoff = timezone.now() - timedelta(days=2)
+        try:
+            self.cleanup(timezone.now() - timedelta(days=2))
+        finally:
+            # This runs as its own process (cron); hand the counters to METRICS_DIR
+            registry.flush(force=True)
+
+    def cleanup(self, cutoff):
+        self.cleanup_chunked_uploads(cutoff)
+
         old_images = ExtractedImage.objects.filter(created_at__lt=cutoff)
         count = old_images.count()
 
@@ -29,22 +38,38 @@ class Command(BaseCommand):
 
         logger.info(f"Found {count} old images. Starting cleanup...")
 
-        # Gather all folders that contain expired images
+        # Gather all folders that contain expired images (file names only, not whole rows)
+        storage = ExtractedImage._meta.get_field('image').storage
         folders_to_delete = set()
-        for img in old_images:
-            folder_path = os.path.dirname(img.image.path)
-            folders_to_delete.add(folder_path)
+        for name in old_images.exclude(image='').values_list('image', flat=True).iterator():
+            folders_to_delete.add(os.path.dirname(storage.path(name)))
 
         # Delete DB records first to keep consistency
         old_images.delete()
+        CLEANUP_DELETED.inc(count, kind='images')
 
         # Now delete the folders
         for folder in folders_to_delete:
             try:
                 if os.path.isdir(folder):
                     shutil.rmtree(folder)
+                    CLEANUP_DELETED.inc(kind='folders')
                     logger.info(f"Deleted folder: {folder}")
             except Exception as e:
                 logger.error(f"Failed to delete folder {folder}: {e}")
 
         logger.info("✅ Cleanup complete.")
+
+    def cleanup_chunked_uploads(self, cutoff):
+        """ Remove resumable uploads (and their partial files) that were not touched since the cutoff."""
+        stale = ChunkedUpload.objects.filter(updated_at__lt=cutoff)
+        for upload in stale.only('id').iterator():
+            try:
+                if os.path.exists(upload.path):
+                    os.remove(upload.path)
+            except Exception as e:
+                logger.error(f"Failed to delete partial upload {upload.path}: {e}")
+        deleted, _ = stale.delete()
+        if deleted:
+            CLEANUP_DELETED.inc(deleted, kind='chunked_uploads')
+            logger.info(f"Deleted {deleted} stale chunked uploads.")
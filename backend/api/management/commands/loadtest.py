@@ -0,0 +1,183 @@
+import asyncio
+import getpass
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmarks import generators
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+# Relative weights of the actions per mix; every virtual user picks its next action at random
+MIXES = {
+    'browse': {'list_uploaded_fotos': 4, 'weight_data': 4, 'cross_reference': 2, 'login': 1},
+    'import': {'upload_fotos': 3, 'list_uploaded_fotos': 3, 'weight_data': 1, 'login': 1},
+    'mixed': {'list_uploaded_fotos': 4, 'weight_data': 3, 'cross_reference': 2, 'upload_fotos': 1, 'login': 1},
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+class VirtualUser:
+    """One logged in client (own session and CSRF cookies) doing one request at a time."""
+
+    def __init__(self, client, options, upload):
+        self.client = client
+        self.options = options
+        self.upload = upload
+
+    async def login(self):
+        return await self.client.post('/api/login/', json={
+            'username': self.options['username'], 'password': self.options['password'],
+        })
+
+    async def list_uploaded_fotos(self):
+        return await self.client.get('/api/list_uploaded_fotos/')
+
+    async def weight_data(self):
+        return await self.client.get('/api/weight-data/', params={'ordering': '-date'})
+
+    async def cross_reference(self):
+        return await self.client.get('/api/identity-checker/cross-reference/', params={
+            'application': self.options['application'], 'view': 'summary',
+        })
+
+    async def upload_fotos(self):
+        return await self.client.post(
+            '/api/upload-fotos/',
+            files={'file': ('loadtest.xml', self.upload, 'text/xml')},
+            headers={'X-CSRFToken': self.client.cookies.get('csrftoken', '')},
+        )
+
+
+class Command(BaseCommand):
+    """
+        Load test a running server with a mix of API requests from concurrent, logged in clients,
+        and report throughput and p50/p95/p99 latency per action. Use it to size the number of
+        gunicorn/uvicorn workers: repeat with more workers or a higher --concurrency until p95
+        or throughput stops improving.
+
+        python3 manage.py loadtest --username admin --concurrency 20 --duration 60 --mix browse
+
+        Needs httpx (pip install httpx). The import mixes store photos: run them against a test
+        server, not production. The password is asked for unless LOADTEST_PASSWORD is set.
+    """
+    help = 'Drive a mix of API requests against a running server and report latency percentiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server')
+        parser.add_argument('--username', required=True, help='User the virtual users log in as')
+        parser.add_argument('--concurrency', type=int, default=10, help='Number of virtual users')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run, after the warmup')
+        parser.add_argument('--warmup', type=float, default=5, help='Seconds of load that are not measured')
+        parser.add_argument('--mix', choices=list(MIXES), default='browse', help='Weights of the actions')
+        parser.add_argument('--application', default='iprotect', help='Application for cross-reference/')
+        parser.add_argument('--photos', type=int, default=10, help='Photos per upload-fotos/ request')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request fails')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if httpx is None:
+            raise CommandError('loadtest needs httpx: pip install httpx')
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        options['password'] = os.environ.get('LOADTEST_PASSWORD') or getpass.getpass()
+
+        upload = b''
+        if 'upload_fotos' in MIXES[options['mix']]:
+            with tempfile.NamedTemporaryFile(suffix='.xml') as f:
+                generators.photo_export_xml(f.name, options['photos'], random.Random(0))
+                upload = f.read()
+
+        samples, elapsed = asyncio.run(self.run(options, upload))
+        results = self.summarize(samples, elapsed)
+        self.report(options, results, elapsed)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'options': {k: v for k, v in options.items() if k != 'password'},
+                           'elapsed_s': elapsed, 'results': results}, f, indent=2, default=str)
+
+    async def run(self, options, upload):
+        """Run the virtual users; returns ({action: [(seconds, ok)]}, measured seconds)."""
+        samples = {}
+        actions, weights = zip(*MIXES[options['mix']].items())
+
+        async def virtual_user(user, measure_from, stop_at):
+            while (now := time.perf_counter()) < stop_at:
+                action = random.choices(actions, weights)[0]
+                try:
+                    response = await getattr(user, action)()
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if now >= measure_from:
+                    samples.setdefault(action, []).append((time.perf_counter() - now, ok))
+
+        clients = [httpx.AsyncClient(base_url=options['url'], timeout=options['timeout'])
+                   for _ in range(options['concurrency'])]
+        try:
+            # Log everyone in first (password hashing is slow), so the load starts at full concurrency
+            users = [VirtualUser(client, options, upload) for client in clients]
+            for response in await asyncio.gather(*(user.login() for user in users)):
+                if response.status_code != 200:
+                    raise CommandError(f"Login failed ({response.status_code}): {response.text[:200]}")
+
+            measure_from = time.perf_counter() + options['warmup']
+            stop_at = measure_from + options['duration']
+            await asyncio.gather(*(virtual_user(user, measure_from, stop_at) for user in users))
+            return samples, time.perf_counter() - measure_from
+        finally:
+            await asyncio.gather(*(client.aclose() for client in clients))
+
+    def summarize(self, samples, elapsed):
+        results = []
+        everything = []
+        for action in sorted(samples):
+            results.append(self.stats(action, samples[action], elapsed))
+            everything.extend(samples[action])
+        results.append(self.stats('total', everything, elapsed))
+        return results
+
+    @staticmethod
+    def stats(action, samples, elapsed):
+        latencies = sorted(seconds for seconds, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            'action': action,
+            'requests': len(samples),
+            'errors': errors,
+            'rps': len(samples) / elapsed if elapsed > 0 else 0,
+            'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else None,
+            'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+            'p95_ms': percentile(latencies, 95) * 1000 if latencies else None,
+            'p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+            'max_ms': latencies[-1] * 1000 if latencies else None,
+        }
+
+    def report(self, options, results, elapsed):
+        self.stdout.write(
+            f"{options['url']}, mix {options['mix']}, {options['concurrency']} virtual users, {elapsed:.1f} s measured"
+        )
+        self.stdout.write(
+            f"{'action':<22}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        )
+        for result in results:
+            if not result['requests']:
+                continue
+            self.stdout.write(
+                f"{result['action']:<22}{result['requests']:>9}{result['errors']:>8}{result['rps']:>9.1f}"
+                f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['max_ms']:>9.1f}"
+            )
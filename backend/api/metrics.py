@@ -0,0 +1,273 @@
+"""
+In-process metrics in the Prometheus text exposition format, without extra dependencies.
+
+    from api.metrics import registry
+
+    PHOTOS_IMPORTED = registry.counter('api_photos_imported_total', 'Photos stored', ['endpoint'])
+    PHOTOS_IMPORTED.inc(len(saved_images), endpoint='upload_fotos')
+
+GET /api/metrics/ (role 'A') returns all metrics. MetricsMiddleware records the
+latency of every request per URL route.
+
+Multi-process (gunicorn workers, cron commands): set METRICS_DIR to a directory
+shared by all processes. Every process then writes its values to its own file
+there (at most every METRICS_FLUSH_INTERVAL seconds, and at exit) and metrics/
+adds up all files. Values of stopped processes are kept, so counters never go
+back; clear the directory when the service (re)starts.
+"""
+
+import atexit
+import json
+import os
+import threading
+import uuid
+import weakref
+from time import monotonic, perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+METRICS_DIR = getattr(settings, 'METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            values = self.registry.values.setdefault(self.name, {})
+            values[key] = values.get(key, 0) + amount
+
+    @staticmethod
+    def merge(current, value):
+        return (current or 0) + value
+
+    def expose(self, values):
+        lines = []
+        for key, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, key)} {_number(value)}')
+        return lines
+
+
+class Histogram(Counter):
+    """Stored per label set as [count per bucket..., count above the last bucket, sum]."""
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self.registry.lock:
+            values = self.registry.values.setdefault(self.name, {})
+            entry = values.get(key)
+            if entry is None:
+                entry = values[key] = [0] * (len(self.buckets) + 2)
+            entry[index] += 1
+            entry[-1] += value
+
+    @staticmethod
+    def merge(current, value):
+        if current is None:
+            return list(value)
+        return [a + b for a, b in zip(current, value)]
+
+    def expose(self, values):
+        lines = []
+        for key, entry in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), entry[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(entry[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self, directory=''):
+        self.directory = directory
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._reset()
+        _registries.add(self)
+
+    def _reset(self):
+        # Also called in a forked child: it must not report its parent's values again
+        self.values = {}
+        self.pid = os.getpid()
+        self.filename = f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+        self.last_flush = monotonic()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.metrics.setdefault(name, Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(self, name, documentation, labelnames, buckets))
+
+    def _after_fork(self):
+        # Another thread may have held the lock while the process forked
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _check_fork(self):
+        # Forks that bypass os.fork() (and so _reset_after_fork)
+        if self.pid != os.getpid():
+            with self.lock:
+                self._reset()
+
+    def flush(self, force=False):
+        """Write this process' values to METRICS_DIR (no-op without one)."""
+        self._check_fork()
+        if not self.directory or (not force and monotonic() - self.last_flush < METRICS_FLUSH_INTERVAL):
+            return
+        with self.lock:
+            data = {name: [[list(key), value] for key, value in values.items()] for name, values in self.values.items()}
+            self.last_flush = monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self.filename)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """Values of all processes (or only this one without METRICS_DIR), per metric name."""
+        self._check_fork()
+        if not self.directory:
+            with self.lock:
+                return {name: dict(values) for name, values in self.values.items()}
+
+        self.flush(force=True)
+        merged = {}
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # removed or replaced while reading
+            for name, items in data.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                values = merged.setdefault(name, {})
+                for key, value in items:
+                    key = tuple(key)
+                    values[key] = metric.merge(values.get(key), value)
+        return merged
+
+    def expose(self):
+        """All metrics in the Prometheus text format."""
+        collected = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            lines.extend(metric.expose(collected.get(name, {})))
+        return '\n'.join(lines) + '\n'
+
+
+# Every Registry, so a forked child (gunicorn --preload) starts with empty values before
+# it records anything: values recorded first and reset at the first flush would be lost
+_registries = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    for forked in list(_registries):
+        forked._after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+registry = Registry(METRICS_DIR)
+atexit.register(registry.flush, force=True)
+
+REQUEST_LATENCY = registry.histogram(
+    'api_request_duration_seconds', 'Request latency per URL route', ['route', 'method'],
+)
+PHOTO_UPLOADS = registry.counter('api_photo_uploads_total', 'Photo upload requests that stored photos', ['endpoint'])
+PHOTOS_IMPORTED = registry.counter('api_photos_imported_total', 'Photos stored', ['endpoint'])
+WEIGHT_ROWS_IMPORTED = registry.counter('api_weight_rows_imported_total', 'Weight measurements imported from CSV')
+MEDIA_BYTES_WRITTEN = registry.counter('api_media_bytes_written_total', 'Bytes of uploaded files stored in MEDIA_ROOT', ['endpoint'])
+CLEANUP_DELETED = registry.counter('api_cleanup_deleted_total', 'Objects removed by cleanup_old_images', ['kind'])
+BUDGET_VIOLATIONS = registry.counter(
+    'api_budget_violations_total', 'Requests over their query or latency budget (API_QUERY_BUDGETS)', ['route', 'kind'],
+)
+
+
+def record_photos(endpoint, images):
+    """Count photos stored by an upload endpoint and the bytes they take in MEDIA_ROOT."""
+    if not images:
+        return
+    PHOTO_UPLOADS.inc(endpoint=endpoint)
+    PHOTOS_IMPORTED.inc(len(images), endpoint=endpoint)
+    # The stored file's size: image_size is whatever the client sent for upload-foto/
+    MEDIA_BYTES_WRITTEN.inc(sum(image.image.size for image in images), endpoint=endpoint)
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    # The URL pattern, not the path: ids in URLs and unresolved paths can't create new series
+    return match.route if match else '<unresolved>'
+
+
+class MetricsMiddleware:
+    """Latency histogram per URL route. Removed from the stack when METRICS_ENABLED is off."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = perf_counter()
+        response = self.get_response(request)
+        self.record(request, perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = perf_counter()
+        response = await self.get_response(request)
+        self.record(request, perf_counter() - start)
+        return response
+
+    def record(self, request, seconds):
+        REQUEST_LATENCY.observe(seconds, route=_route(request), method=request.method)
+        registry.flush()
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='extractedimage',
+            index=models.Index(fields=['user', 'created_at'], name='api_extract_user_id_605f4e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extractedimage',
+            index=models.Index(fields=['created_at'], name='api_extract_created_75140e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weightmeasurement',
+            index=models.Index(fields=['user', 'date'], name='api_weightm_user_id_9f4c67_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(help_text='View (METHOD module.view) or command that ran the query', max_length=255)),
+                ('database', models.CharField(max_length=100)),
+                ('fingerprint', models.CharField(db_index=True, help_text='md5 of the SQL, to group the same query', max_length=32)),
+                ('tables', models.CharField(blank=True, max_length=255)),
+                ('sql', models.TextField()),
+                ('params', models.TextField(blank=True)),
+                ('duration_ms', models.FloatField()),
+                ('explain', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'slow queries',
+            },
+        ),
+    ]
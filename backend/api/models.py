@@ -1,8 +1,12 @@
 
+import os
+import uuid
+
 from django.utils import timezone
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 
 
@@ -37,6 +41,14 @@ class ExtractedImage(models.Model):
     image_type = models.CharField(max_length=10, blank=True, null=True)
     image_size = models.PositiveIntegerField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # part of the list ETag (api.conditional)
+
+    class Meta:
+        indexes = [
+            # Listing (newest first, all or per user) and cleanup_old_images (created_at < cutoff)
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.medewerker_number} - {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
@@ -48,6 +60,98 @@ class ExtractedImage(models.Model):
         super().delete(*args, **kwargs)
 
 
+class ChunkedUpload(models.Model):
+    """ A resumable upload that is received in chunks and imported once complete."""
+    TARGET_CHOICES = (
+        ('fotos', 'Photo export (XML or ZIP)'),
+        ('foto', 'Single photo'),
+    )
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chunked_uploads'
+    )
+    filename = models.CharField(max_length=255)
+    target = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    image_type = models.CharField(max_length=10, blank=True, null=True)
+    total_size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.filename} ({self.offset}/{self.total_size})"
+
+    @property
+    def path(self):
+        """ Location of the partial file on disk."""
+        return os.path.join(settings.MEDIA_ROOT, 'chunked', f"{self.id}.part")
+
+
+def profile_storage():
+    """ Profiles can contain request details: keep them out of the public MEDIA_ROOT."""
+    return FileSystemStorage(location=getattr(settings, 'PROFILE_ROOT', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+class RequestProfile(models.Model):
+    """ One request that an admin ran under a profiler (see api.profiling)."""
+    MODE_CHOICES = (
+        ('cprofile', 'cProfile'),
+        ('sample', 'Sampling profiler'),
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='request_profiles'
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    duration_ms = models.FloatField()
+    # cProfile: pstats dump (snakeviz, pstats); sample: collapsed stacks (speedscope, flamegraph.pl)
+    file = models.FileField(upload_to='%Y/%m/', storage=profile_storage)
+    summary = models.TextField(blank=True)
+    peak_memory = models.PositiveBigIntegerField(blank=True, null=True, help_text='tracemalloc peak in bytes')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.mode}, {self.duration_ms:.0f} ms)"
+
+    def delete(self, *args, **kwargs):
+        """ Make sure we delete the profile file when removing the row"""
+        if self.file:
+            self.file.delete(save=False)
+        super().delete(*args, **kwargs)
+
+
+
+class SlowQuery(models.Model):
+    """ A query that took longer than API_SLOW_QUERY_MS (see api.slow_queries)."""
+    origin = models.CharField(max_length=255, help_text='View (METHOD module.view) or command that ran the query')
+    database = models.CharField(max_length=100)
+    fingerprint = models.CharField(max_length=32, db_index=True, help_text='md5 of the SQL, to group the same query')
+    tables = models.CharField(max_length=255, blank=True)
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    duration_ms = models.FloatField()
+    explain = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'slow queries'
+
+    def __str__(self):
+        return f"{self.origin} ({self.duration_ms:.0f} ms)"
+
+
 class BaseUser(models.Model):
     SOURCE_CHOICES = (
         ('iProtect', 'iProtect'),
@@ -100,6 +204,12 @@ class WeightMeasurement(models.Model):
     body_water = models.DecimalField(max_digits=5, decimal_places=2)
     muscle_mass = models.DecimalField(max_digits=5, decimal_places=2)
     bmi = models.DecimalField(max_digits=5, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)  # part of the list ETag (api.conditional)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date']),
+        ]
 
     def __str__(self):
         return f"{self.date} - {self.weight_kg} kg"
@@ -0,0 +1,314 @@
+"""
+On-demand profiling of single requests by admins.
+
+With API_PROFILING_ENABLED = True an admin (role 'A') can run one request
+under a profiler by adding a header or query flag:
+
+    X-Profile: cprofile            (or ?_profile=cprofile, also ?_profile=1)
+    X-Profile: sample              sampling profiler, collapsed stacks
+    X-Profile: cprofile,memory     + tracemalloc allocation statistics
+
+The result is stored as a RequestProfile (download it in the admin) and its id
+is returned in the X-Profile-Id response header. One request is profiled at a
+time; a second flagged request meanwhile runs normally with `X-Profile: busy`.
+
+Flags from other users are ignored. Requests without a flag only cost a
+header and a query string lookup; with the setting off the middleware is
+removed from the stack.
+
+Note that a profile covers the view and the middleware below this one, not
+the body of streaming responses (exports), and that with cProfile other
+requests running at the same time in other threads may show up.
+
+Under ASGI a sync view runs in a sync_to_async thread, which a profiler
+started on the event loop thread doesn't see. There the middleware profiles
+just the view (and the rendering of DRF responses) from process_view, in the
+thread the view runs in.
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+# The GIL switch interval (5 ms) bounds how often another thread can take a sample
+SAMPLE_INTERVAL = getattr(settings, 'API_PROFILING_SAMPLE_INTERVAL', 0.005)
+SUMMARY_LINES = 30
+
+# Profilers are process wide (cProfile can't be nested, tracemalloc is global)
+_profiling = threading.Lock()
+
+
+def requested_options(request):
+    """(mode, memory) from the X-Profile header or _profile query flag, None when not asked for."""
+    value = request.META.get('HTTP_X_PROFILE')
+    if value is None:
+        if '_profile' not in request.META.get('QUERY_STRING', ''):
+            return None
+        value = request.GET.get('_profile')
+        if value is None:
+            return None
+    options = {option.strip().lower() for option in value.split(',')}
+    mode = 'sample' if 'sample' in options else 'cprofile'
+    return mode, 'memory' in options
+
+
+def authenticate(request):
+    """
+    The user of a flagged request. Token users are only known to DRF views, so the
+    header based DRF authenticators are tried as well (not SessionAuthentication:
+    request.user already covers sessions and its CSRF check would read the body).
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    drf_request = Request(request)
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        if issubclass(authentication_class, SessionAuthentication):
+            continue
+        try:
+            result = authentication_class().authenticate(drf_request)
+        except APIException:
+            return None
+        if result is not None:
+            return result[0]
+    return None
+
+
+def is_admin(user):
+    return user is not None and getattr(user, 'role', None) == 'A'
+
+
+class Sampler:
+    """Samples the stack of one thread; output in collapsed stack format (speedscope, flamegraph.pl)."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='api-profiling-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._stack(frame)] += 1
+
+    @staticmethod
+    def _stack(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        total = sum(self.stacks.values())
+        inclusive = Counter()
+        for stack, count in self.stacks.items():
+            for name in set(stack.split(';')):
+                inclusive[name] += count
+        lines = [f"{total} samples every {self.interval * 1000:g} ms", "", "samples  %  function"]
+        for name, count in inclusive.most_common(SUMMARY_LINES):
+            lines.append(f"{count:7d} {count * 100 / max(total, 1):5.1f}  {name}")
+        return '\n'.join(lines)
+
+
+class Profiler:
+    """Runs the profilers for one request: `start()`, the request, `stop()`, then `save(...)`."""
+
+    def __init__(self, mode, memory):
+        self.mode = mode
+        self.memory = memory
+        self.peak_memory = None
+        self.memory_summary = ''
+        self.duration = None
+
+    def start(self):
+        if self.memory:
+            self._stop_tracemalloc = not tracemalloc.is_tracing()
+            if self._stop_tracemalloc:
+                tracemalloc.start(10)
+            tracemalloc.reset_peak()
+        if self.mode == 'sample':
+            self.sampler = Sampler(threading.get_ident())
+            self.sampler.start()
+        else:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.started = perf_counter()
+
+    def stop(self):
+        self.duration = perf_counter() - self.started
+        if self.mode == 'sample':
+            self.sampler.stop()
+        else:
+            self.profile.disable()
+        if self.memory:
+            self._memory_stats()
+
+    def _memory_stats(self):
+        snapshot = tracemalloc.take_snapshot()
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        if self._stop_tracemalloc:
+            tracemalloc.stop()
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        lines = [f"tracemalloc peak: {self.peak_memory} bytes", "", "Largest allocations still alive:"]
+        lines.extend(str(stat) for stat in snapshot.statistics('lineno')[:SUMMARY_LINES])
+        self.memory_summary = '\n'.join(lines)
+
+    def _result(self):
+        """(file content, extension, summary) for the profile."""
+        if self.mode == 'sample':
+            return self.sampler.collapsed().encode(), 'txt', self.sampler.summary()
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        return marshal.dumps(stats.stats), 'prof', stats.stream.getvalue().strip()
+
+    def save(self, request, user, response):
+        from .models import RequestProfile
+
+        content, extension, summary = self._result()
+        if self.memory_summary:
+            summary = f"{summary}\n\n{self.memory_summary}"
+        profile = RequestProfile(
+            user_id=user.pk,
+            method=request.method,
+            path=request.get_full_path()[:2048],
+            mode=self.mode,
+            status_code=response.status_code,
+            duration_ms=self.duration * 1000,
+            summary=summary,
+            peak_memory=self.peak_memory,
+        )
+        filename = f"{timezone.now():%Y%m%d-%H%M%S}-{self.mode}.{extension}"
+        profile.file.save(filename, ContentFile(content), save=False)
+        profile.save()
+        return profile
+
+
+class ProfilingMiddleware:
+    """See the module docstring. Removed from the stack when API_PROFILING_ENABLED is off."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            # Only under ASGI, so WSGI requests don't pay for an extra middleware hook
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        options = requested_options(request)
+        if options is None:
+            return self.get_response(request)
+
+        user = authenticate(request)
+        if not is_admin(user):
+            return self.get_response(request)
+        if not _profiling.acquire(blocking=False):
+            response = self.get_response(request)
+            response['X-Profile'] = 'busy'
+            return response
+
+        profiler = Profiler(*options)
+        try:
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        finally:
+            _profiling.release()
+
+        profile = profiler.save(request, user, response)
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    async def __acall__(self, request):
+        options = requested_options(request)
+        if options is None:
+            return await self.get_response(request)
+
+        user = await sync_to_async(authenticate)(request)
+        if not is_admin(user):
+            return await self.get_response(request)
+        if not _profiling.acquire(blocking=False):
+            response = await self.get_response(request)
+            response['X-Profile'] = 'busy'
+            return response
+
+        # Started by _aprocess_view around the view itself
+        request._api_profiler = Profiler(*options)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profiling.release()
+
+        profiler = request._api_profiler
+        if profiler.duration is None:  # no view ran (404, answered by another middleware)
+            return response
+        profile = await sync_to_async(profiler.save)(request, user, response)
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        profiler = getattr(request, '_api_profiler', None)
+        if profiler is None:
+            return None
+        if iscoroutinefunction(view_func):
+            profiler.start()
+            try:
+                return await view_func(request, *view_args, **view_kwargs)
+            finally:
+                profiler.stop()
+        # The thread Django would run the view in as well
+        return await sync_to_async(self._run_view, thread_sensitive=True)(
+            profiler, request, view_func, view_args, view_kwargs)
+
+    @staticmethod
+    def _run_view(profiler, request, view_func, view_args, view_kwargs):
+        profiler.start()
+        try:
+            response = view_func(request, *view_args, **view_kwargs)
+            if callable(getattr(response, 'render', None)):
+                response = response.render()
+        finally:
+            profiler.stop()
+        return response
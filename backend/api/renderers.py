@@ -0,0 +1,96 @@
+"""
+Renderers for large API responses.
+
+- FastJSONRenderer: DRF's JSONRenderer, encoded with orjson when it is
+  installed (falls back to the stdlib encoder otherwise). For what our
+  serializers return the bytes are the same (checked in api/tests.py), but
+  floats in exponent notation are spelled differently (1e16, not 1e+16) and
+  NaN/Infinity become null where JSONRenderer raises an error.
+- ColumnarJSONRenderer: lists of objects become one array per field,
+  e.g. [{"date": .., "weight_kg": ..}, ..] -> {"date": [..], "weight_kg": [..]}.
+  Requested with `Accept: application/vnd.columnar+json` or `?format=columnar`.
+- MessagePackRenderer: binary encoding, only registered when msgpack is
+  installed. Requested with `Accept: application/msgpack` or `?format=msgpack`.
+"""
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .timing import timer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+# Handles what orjson/msgpack can't encode natively (Decimal, lazy strings, querysets, ...)
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    return _encoder.default(obj)
+
+
+def to_columns(data):
+    """
+    Convert every list of objects in `data` into a dict of arrays per field.
+    Other values (including the pagination envelope) are left as they are.
+    """
+    if isinstance(data, dict):
+        return {key: to_columns(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)) and data and all(isinstance(item, dict) for item in data):
+        fields = dict.fromkeys(data[0])
+        for item in data:
+            if item.keys() != fields.keys():
+                fields.update(dict.fromkeys(item))
+        return {field: [item.get(field) for item in data] for field in fields}
+    return data
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timer('serialize'):
+            return self.encode(data, accepted_media_type, renderer_context)
+
+    def encode(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            # orjson only knows 2-space indents; the browsable API asks for 4
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # e.g. integers over 64 bits, which the stdlib encoder does handle
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, so the output is also safe inside <script>
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    media_type = 'application/vnd.columnar+json'
+    format = 'columnar'
+
+    def encode(self, data, accepted_media_type=None, renderer_context=None):
+        return super().encode(to_columns(data), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timer('serialize'):
+            return msgpack.packb(data, default=_default, use_bin_type=True)
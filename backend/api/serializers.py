@@ -1,6 +1,10 @@
 # backend/api/serializer.py
+from django.conf import settings
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
 from .models import ExtractedImage, IProtectUser, WeightMeasurement
+from .timing import timer
 
 
 class ExtractedImageSerializer(serializers.ModelSerializer):
@@ -66,3 +70,65 @@ class WeightMeasurementsSerializer(serializers.ModelSerializer):
             'muscle_mass',
             'bmi',
         ]
+
+
+def _isoformat(value):
+    """ Same output as DRF's DateTimeField/DateField for the values read from the DB."""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class ExtractedImageReadSerializer:
+    """
+    Read-only counterpart of ExtractedImageSerializer for list endpoints.
+    Works on queryset.values(*values_fields) rows and builds plain dicts; the absolute
+    media URL prefix is computed once instead of per row (assumes FileSystemStorage).
+    """
+    values_fields = (
+        'id', 'user__username', 'user__role', 'medewerker_number', 'image',
+        'original_filename', 'image_type', 'image_size', 'created_at',
+    )
+
+    def __init__(self, request=None):
+        self.media_base = request.build_absolute_uri(settings.MEDIA_URL) if request else settings.MEDIA_URL
+
+    def to_representation(self, row):
+        url = self.media_base + filepath_to_uri(row['image']).lstrip('/') if row['image'] else None
+        return {
+            'id': row['id'],
+            'username': row['user__username'],
+            'role': row['user__role'],
+            'medewerker_number': row['medewerker_number'],
+            'image': url,
+            'url': url,
+            'original_filename': row['original_filename'],
+            'image_type': row['image_type'],
+            'image_size': row['image_size'],
+            'created_at': _isoformat(row['created_at']),
+        }
+
+    def serialize(self, rows):
+        with timer('serialize'):
+            return [self.to_representation(row) for row in rows]
+
+
+class WeightMeasurementReadSerializer:
+    """ Read-only counterpart of WeightMeasurementsSerializer working on values() rows."""
+    values_fields = ('user', 'date', 'weight_kg', 'bone_mass', 'body_fat', 'body_water', 'muscle_mass', 'bmi')
+    decimal_fields = ('weight_kg', 'bone_mass', 'body_fat', 'body_water', 'muscle_mass', 'bmi')
+
+    def to_representation(self, row):
+        data = {'user': row['user'], 'date': row['date'].isoformat()}
+        for field in self.decimal_fields:
+            data[field] = '{:f}'.format(row[field])  # DRF renders DecimalField as a string
+        return data
+
+    def serialize(self, rows):
+        with timer('serialize'):
+            return [self.to_representation(row) for row in rows]
@@ -0,0 +1,185 @@
+"""
+Slow-query log: queries over API_SLOW_QUERY_MS are logged to the 'api' logger and
+stored as SlowQuery (read them in the admin), with the view or management command
+that ran them.
+
+- A database execute wrapper, installed on every connection in ApiConfig.ready,
+  times every query.
+- SlowQueryMiddleware tells it which view is running; outside a request the
+  origin is the command line (`manage.py cleanup_old_images`).
+- A fraction (API_SLOW_QUERY_EXPLAIN_RATE) of slow SELECTs is run again under
+  EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL, or EXPLAIN QUERY PLAN on SQLite, and
+  the plan is stored with the query. Note that ANALYZE runs the query a second time.
+
+The same query (same SQL, parameters aside) is stored at most once per
+API_SLOW_QUERY_REPEAT_INTERVAL seconds per process; it is still logged every
+time. Parameters can hold personal data and are shown in the admin, so they
+are only stored with API_SLOW_QUERY_STORE_PARAMS = True. EXPLAIN ANALYZE plans
+can still show values the query was filtered on.
+
+A SlowQuery row is written on the connection (and in the transaction) that ran
+the query, so it is lost when that transaction is rolled back; the log line is
+not. A separate connection would keep it, but on SQLite it would wait for the
+caller's write lock. Look for rolled back slow queries in the 'api' log.
+"""
+
+import hashlib
+import logging
+import os
+import random
+import re
+import sys
+import threading
+from contextvars import ContextVar
+from time import monotonic, perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, transaction
+
+logger = logging.getLogger('api')
+
+SLOW_QUERY_MS = getattr(settings, 'API_SLOW_QUERY_MS', 0)
+EXPLAIN_RATE = getattr(settings, 'API_SLOW_QUERY_EXPLAIN_RATE', 0.0)
+REPEAT_INTERVAL = getattr(settings, 'API_SLOW_QUERY_REPEAT_INTERVAL', 60)
+STORE_PARAMS = getattr(settings, 'API_SLOW_QUERY_STORE_PARAMS', False)
+
+# What runs outside a request: 'manage.py cleanup_old_images', 'gunicorn', ...
+PROCESS_ORIGIN = ' '.join(os.path.basename(arg) for arg in sys.argv[:2])[:255]
+
+TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+"?(\w+)"?', re.IGNORECASE)
+
+# [origin] of the current request, filled in by the middleware; None outside a request.
+# A list, because process_view may run in another context than __call__
+_origin = ContextVar('api_slow_query_origin', default=None)
+# Set while storing or explaining a slow query, so those queries aren't timed themselves
+_recording = ContextVar('api_slow_query_recording', default=False)
+
+_last_stored = {}
+MAX_FINGERPRINTS = 10000
+_last_stored_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    return hashlib.md5(sql.encode(), usedforsecurity=False).hexdigest()
+
+
+def tables(sql):
+    return ','.join(dict.fromkeys(TABLE_RE.findall(sql)))[:255]
+
+
+def _should_store(key):
+    now = monotonic()
+    with _last_stored_lock:
+        if now - _last_stored.get(key, -REPEAT_INTERVAL) < REPEAT_INTERVAL:
+            return False
+        if len(_last_stored) >= MAX_FINGERPRINTS:
+            _last_stored.clear()  # e.g. IN (...) lists of every length; forgetting only costs an extra row
+        _last_stored[key] = now
+        return True
+
+
+def explain(connection, sql, params):
+    """The plan of a SELECT, or '' when the database isn't supported."""
+    if connection.vendor == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+    elif connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        return ''
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def record(connection, sql, params, duration_ms):
+    from .models import SlowQuery
+
+    holder = _origin.get()
+    origin = holder[0] if holder else PROCESS_ORIGIN
+    logger.warning('slow query %.1f ms in %s: %s', duration_ms, origin, sql[:1000])
+
+    key = fingerprint(sql)
+    if not _should_store(key):
+        return
+    token = _recording.set(True)
+    try:
+        plan = ''
+        if random.random() < EXPLAIN_RATE and sql.lstrip()[:6].upper() == 'SELECT':
+            try:
+                # Savepoints, so a failure doesn't break the caller's transaction
+                with transaction.atomic(using=connection.alias):
+                    plan = explain(connection, sql, params)
+            except DatabaseError as e:
+                plan = f'EXPLAIN failed: {e}'
+        with transaction.atomic(using=connection.alias):
+            SlowQuery.objects.using(connection.alias).create(
+                origin=origin[:255],
+                database=connection.alias,
+                fingerprint=key,
+                tables=tables(sql),
+                sql=sql,
+                params=repr(params)[:10000] if STORE_PARAMS else '',
+                duration_ms=duration_ms,
+                explain=plan,
+            )
+    except DatabaseError:
+        logger.exception('Could not store slow query')
+    finally:
+        _recording.reset(token)
+
+
+def slow_query_logger(execute, sql, params, many, context):
+    """Database execute wrapper, see install_slow_query_logger."""
+    if _recording.get():
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (perf_counter() - start) * 1000
+    # executemany() is timed as a whole and can't be explained, so it is left out
+    if duration_ms >= SLOW_QUERY_MS and not many:
+        record(context['connection'], sql, params, duration_ms)
+    return result
+
+
+def install_slow_query_logger(sender, connection, **kwargs):
+    """connection_created receiver, connected in ApiConfig.ready when API_SLOW_QUERY_MS is set."""
+    if slow_query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_logger)
+
+
+class SlowQueryMiddleware:
+    """Makes the view the origin of slow queries. Removed from the stack when API_SLOW_QUERY_MS is not set."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not SLOW_QUERY_MS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _origin.set([f'{request.method} {request.path}'])
+        try:
+            return self.get_response(request)
+        finally:
+            _origin.reset(token)
+
+    async def __acall__(self, request):
+        token = _origin.set([f'{request.method} {request.path}'])
+        try:
+            return await self.get_response(request)
+        finally:
+            _origin.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        holder = _origin.get()
+        if holder is not None:
+            # @api_view and as_view() views carry the name and module of the view they wrap
+            view = getattr(view_func, 'view_class', view_func)
+            holder[0] = f'{request.method} {view.__module__}.{view.__name__}'
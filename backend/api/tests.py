@@ -1,3 +1,691 @@
-from django.test import TestCase
+import base64
+import csv
+import hashlib
+import io
+import marshal
+import os
+import random
+import tempfile
+import datetime
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from . import authentication, metrics, slow_queries, views
+
+from .benchmarks import generators
+from .benchmarks.suite import run_benchmark
+from .budgets import BUDGETS, measure, violations
+from .management.commands.cleanup_old_images import Command as CleanupCommand
+from .metrics import Registry
+from .models import CustomUser, ExtractedImage, RequestProfile, SlowQuery, WeightMeasurement
+from .renderers import FastJSONRenderer
+from .serializers import (ExtractedImageReadSerializer, ExtractedImageSerializer, WeightMeasurementReadSerializer,
+                          WeightMeasurementsSerializer)
+from .upload_handlers import WEIGHT_CSV_METADATA_LINES, WeightCsvRowParser
+
+# Large enough that a query per row or a Python loop over all rows shows up
+SEED_ROWS = 1000
+
+
+def seed_images(user, count):
+    ExtractedImage.objects.bulk_create(
+        ExtractedImage(user=user, medewerker_number=str(i), image=f'images_{user.username}/{i}.jpg',
+                       original_filename=f'{i}.jpg', image_type='jpg', image_size=8192)
+        for i in range(count)
+    )
+
+
+def seed_weight(user, count):
+    WeightMeasurement.objects.bulk_create(
+        WeightMeasurement(user=user, date=dt.date(), weight_kg=weight, bone_mass=bone, body_fat=fat,
+                          body_water=water, muscle_mass=muscle, bmi=bmi)
+        for dt, weight, bone, fat, water, muscle, bmi in generators.weight_rows(count, random.Random(0))
+    )
+
+
+class BudgetTestCase(TestCase):
+    """Requests a budgeted route (see api/budgets.py) as a logged in user and checks its query budget."""
+
+    def assertWithinBudget(self, route, user, **params):
+        self.client.force_login(user)
+        with measure() as usage:
+            response = self.client.get('/' + route, params)
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        self.assertEqual(violations(route, usage, latency=False), [])
+        return response
+
+
+class ApiBudgetTests(BudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create(username='admin', role='A')
+        cls.user = CustomUser.objects.create(username='user', role='U')
+        other = CustomUser.objects.create(username='other', role='U')
+        for owner in (cls.user, other):
+            seed_images(owner, SEED_ROWS)
+            seed_weight(owner, SEED_ROWS)
+
+    def test_list_uploaded_fotos_admin(self):
+        response = self.assertWithinBudget('api/list_uploaded_fotos/', self.admin)
+        self.assertEqual(response.json()['count'], 2 * SEED_ROWS)
+
+    def test_list_uploaded_fotos_user(self):
+        response = self.assertWithinBudget('api/list_uploaded_fotos/', self.user)
+        self.assertEqual(response.json()['count'], SEED_ROWS)
+
+    def test_weight_data(self):
+        self.assertWithinBudget('api/weight-data/', self.user, ordering='-date')
+
+    def test_latest_datetime(self):
+        response = self.assertWithinBudget('api/latest-datetime/', self.user)
+        self.assertEqual(response.json()['date'], WeightMeasurement.objects.filter(user=self.user).latest('date').date.isoformat())
+
+    def test_minmaxavg(self):
+        response = self.assertWithinBudget('api/minmaxavg/', self.user)
+        result = response.json()['minmaxavg']
+        weights = WeightMeasurement.objects.filter(user=self.user).values_list('weight_kg', flat=True)
+        self.assertAlmostEqual(float(result['avg']['weight_kg']), float(sum(weights) / len(weights)), places=2)
+        self.assertEqual(float(result['min']['weight_kg']), float(min(weights)))
+        self.assertEqual(float(result['max']['weight_kg']), float(max(weights)))
+
+    def test_userinfo(self):
+        self.assertWithinBudget('api/userinfo/', self.user)
+
+    def test_budgets_cover_existing_routes(self):
+        from django.urls import get_resolver
+
+        routes = set()
+
+        def collect(resolver, prefix=''):
+            for pattern in resolver.url_patterns:
+                if hasattr(pattern, 'url_patterns'):
+                    collect(pattern, prefix + str(pattern.pattern))
+                else:
+                    routes.add(prefix + str(pattern.pattern))
+
+        collect(get_resolver())
+        self.assertEqual(set(BUDGETS) - routes, set())
+
+
+class CleanupOldImagesTests(TestCase):
+    def test_queries_do_not_grow_with_images(self):
+        user = CustomUser.objects.create(username='user', role='U')
+        seed_images(user, SEED_ROWS)
+        ExtractedImage.objects.update(created_at=timezone.now() - timedelta(days=3))
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            folder = os.path.join(media_root, f'images_{user.username}')
+            os.makedirs(folder)
+            # chunked uploads (select, delete), then images (count, file names, delete)
+            with self.assertNumQueries(5):
+                CleanupCommand().cleanup(timezone.now() - timedelta(days=2))
+            self.assertFalse(os.path.exists(folder))
+
+        self.assertFalse(ExtractedImage.objects.exists())
+
+
+class BearerAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='bob', password='secret', role='U')
+
+    def get(self, password='secret'):
+        token = base64.b64encode(f'bob:{password}'.encode()).decode()
+        return self.client.get('/api/userinfo/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_verified_token_is_cached(self):
+        with mock.patch.object(authentication, 'authenticate', wraps=authentication.authenticate) as check:
+            self.assertEqual(self.get().status_code, 200)
+            self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(check.call_count, 1)
+
+    def test_wrong_password_is_not_cached(self):
+        self.assertEqual(self.get('wrong').status_code, 403)
+        self.assertEqual(self.get('wrong').status_code, 403)
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_password_change_invalidates_cached_token(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.user.set_password('changed')
+        self.user.save()
+
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get('changed').status_code, 200)
+
+    def test_deactivation_invalidates_cached_token(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.get().status_code, 403)
+
+
+class SignedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='bob', password='secret', role='U')
+        response = self.client.post('/api/token/', {'username': 'bob', 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        self.token = response.json()['access']
+
+    def get(self):
+        return self.client.get('/api/userinfo/', HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def test_valid_token(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['userinfo']['username'], 'bob')
+
+    def test_password_change_revokes_token(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_deactivation_revokes_token(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_deleted_user(self):
+        self.user.delete()
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_role_change_applies_to_issued_token(self):
+        self.user.role = 'A'
+        self.user.save()
+        self.assertEqual(self.get().json()['userinfo']['role'], 'A')
+
+    def test_user_is_cached(self):
+        self.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().status_code, 200)
+
+    def test_superuser_keeps_admin_rights(self):
+        admin = CustomUser.objects.create_superuser(username='admin', password='secret', role='A')
+        token = self.client.post('/api/token/', {'username': 'admin', 'password': 'secret'}).json()['access']
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {token}')
+
+        for _ in range(2):  # from the database, then from the cache
+            user, _payload = authentication.SignedTokenAuthentication().authenticate(request)
+            self.assertEqual(user.pk, admin.pk)
+            self.assertTrue(user.is_staff and user.is_superuser)
+            self.assertTrue(user.has_perm('api.view_slowquery'))
+
+    def test_tampered_token(self):
+        self.token = self.token[:-2] + ('AA' if not self.token.endswith('AA') else 'BB')
+        self.assertEqual(self.get().status_code, 403)
+
+
+class AsyncUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.client.force_login(CustomUser.objects.create(username='user', role='U'))
+
+    def upload(self, url):
+        upload = SimpleUploadedFile('face.jpg', b'\xff\xd8' + b'x' * 1000, content_type='image/jpeg')
+        return self.client.post(url, {'file': upload, 'image_type': 'jpg', 'image_size': 1002})
+
+    def test_upload_foto_async_matches_sync_view(self):
+        sync_response = self.upload('/api/upload-foto/')
+        async_response = self.upload('/api/async/upload-foto/')
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(async_response['Content-Type'], sync_response['Content-Type'])
+
+        sync_body, async_body = sync_response.json(), async_response.json()
+        self.assertEqual(set(async_body), set(sync_body))
+        # Rendered like the DRF views: compact, not JsonResponse's ", " separators
+        self.assertNotIn(b'", "', async_response.content)
+
+        extracted = ExtractedImage.objects.get(pk=async_body['id'])
+        with extracted.image.open('rb') as f:
+            self.assertEqual(f.read(), b'\xff\xd8' + b'x' * 1000)
+
+    def test_upload_fotos_async_stores_each_photo_as_it_is_parsed(self):
+        with tempfile.NamedTemporaryFile(suffix='.xml') as f:
+            generators.photo_export_xml(f.name, 3, random.Random(0), photo_size=1024)
+            export = SimpleUploadedFile('export.xml', f.read(), content_type='text/xml')
+
+        stored_before = []
+        iter_photos = views.iter_photos
+
+        def counting_iter_photos(xml_source):
+            for photo in iter_photos(xml_source):
+                stored_before.append(ExtractedImage.objects.count())
+                yield photo
+
+        with mock.patch.object(views, 'iter_photos', counting_iter_photos):
+            response = self.client.post('/api/async/upload-fotos/', {'file': export})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+        self.assertEqual(stored_before, [0, 1, 2])
+
+    def test_upload_foto_async_accepts_access_token(self):
+        CustomUser.objects.create_user(username='tokenuser', password='secret', role='U')
+        self.client.logout()
+        token = self.client.post('/api/token/', {'username': 'tokenuser', 'password': 'secret'}).json()['access']
+
+        client = Client(enforce_csrf_checks=True)
+        upload = SimpleUploadedFile('face.jpg', b'\xff\xd8' + b'x' * 1000, content_type='image/jpeg')
+        response = client.post('/api/async/upload-foto/', {'file': upload, 'image_type': 'jpg', 'image_size': 1002},
+                               HTTP_AUTHORIZATION=f'Token {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ExtractedImage.objects.get(pk=response.json()['id']).user.username, 'tokenuser')
+
+        response = client.post('/api/async/upload-foto/', {}, HTTP_AUTHORIZATION='Token invalid')
+        self.assertEqual(response.status_code, 401)
+
+    def test_session_upload_needs_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(CustomUser.objects.get(username='user'))
+        response = client.post('/api/async/upload-foto/', {})
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF', response.json()['error'])
+
+
+class ChunkedUploadTests(TestCase):
+    data = b'\xff\xd8' + b'photo' * 200
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.client.force_login(CustomUser.objects.create(username='user', role='U'))
+        response = self.client.post('/api/chunked-uploads/', {
+            'filename': 'face.jpg', 'total_size': len(self.data), 'target': 'foto', 'image_type': 'jpg',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.url = f"/api/chunked-uploads/{response.json()['id']}/"
+
+    def put(self, offset, chunk, checksum=None):
+        return self.client.put(self.url, chunk, content_type='application/octet-stream', headers={
+            'X-Chunk-Offset': str(offset), 'X-Chunk-SHA256': checksum or hashlib.sha256(chunk).hexdigest(),
+        })
+
+    def upload_all(self):
+        self.assertEqual(self.put(0, self.data[:500]).json()['offset'], 500)
+        self.assertEqual(self.put(500, self.data[500:]).json()['offset'], len(self.data))
+
+    def test_upload_and_complete(self):
+        self.upload_all()
+        response = self.client.post(self.url + 'complete/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'complete')
+        with ExtractedImage.objects.get().image.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_offset_mismatch(self):
+        self.put(0, self.data[:500])
+        for offset in (0, 600):
+            response = self.put(offset, self.data[offset:offset + 100])
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()['offset'], 500)
+
+    def test_checksum_mismatch_does_not_move_offset(self):
+        response = self.put(0, self.data[:500], checksum='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 0)
+        # Resending the chunk works
+        self.assertEqual(self.put(0, self.data[:500]).json()['offset'], 500)
+
+    def test_chunk_past_total_size(self):
+        response = self.put(0, self.data + b'x')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url).json()['offset'], 0)
+
+    def test_complete_twice(self):
+        self.upload_all()
+        self.assertEqual(self.client.post(self.url + 'complete/').status_code, 200)
+        response = self.client.post(self.url + 'complete/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(ExtractedImage.objects.count(), 1)
+        self.assertEqual(self.put(len(self.data), b'x').status_code, 400)
+
+    def test_complete_before_all_chunks(self):
+        self.put(0, self.data[:500])
+        self.assertEqual(self.client.post(self.url + 'complete/').status_code, 400)
+
+    def test_failed_complete_can_be_retried(self):
+        self.upload_all()
+        response = self.client.post(self.url + 'complete/', {'sha256': '0' * 64})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url + 'complete/', {'sha256': hashlib.sha256(self.data).hexdigest()})
+        self.assertEqual(response.status_code, 200)
+
+    def start_export(self, data):
+        """A finished 'fotos' upload of `data`; returns its URL."""
+        response = self.client.post('/api/chunked-uploads/', {
+            'filename': 'export.xml', 'total_size': len(data), 'target': 'fotos',
+        })
+        url = f"/api/chunked-uploads/{response.json()['id']}/"
+        response = self.client.put(url, data, content_type='application/octet-stream', headers={
+            'X-Chunk-Offset': '0', 'X-Chunk-SHA256': hashlib.sha256(data).hexdigest(),
+        })
+        self.assertEqual(response.json()['offset'], len(data))
+        return url
+
+    def photo_export(self, photos):
+        with tempfile.NamedTemporaryFile(suffix='.xml') as f:
+            generators.photo_export_xml(f.name, photos, random.Random(0), photo_size=1024)
+            return f.read()
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(settings.MEDIA_ROOT) for name in names if not name.endswith('.part')]
+
+    def test_corrupt_export_can_be_retried(self):
+        url = self.start_export(b'<export><koppeling_medewerkers_fotos>')
+        for _ in range(2):
+            response = self.client.post(url + 'complete/')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Invalid XML', response.json()['error'])
+            self.assertEqual(self.client.get(url).json()['status'], 'uploading')
+
+    def test_storage_error_keeps_nothing(self):
+        url = self.start_export(self.photo_export(3))
+        real_save = FileSystemStorage._save
+        calls = []
+
+        def failing_save(storage, name, content):
+            calls.append(name)
+            if len(calls) == 2:
+                raise OSError('disk full')
+            return real_save(storage, name, content)
+
+        with mock.patch.object(FileSystemStorage, '_save', failing_save):
+            response = self.client.post(url + 'complete/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ExtractedImage.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+        self.assertEqual(self.client.get(url).json()['status'], 'uploading')
+
+        # The retry imports the export
+        response = self.client.post(url + 'complete/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['images']), 3)
+
+    def test_unexpected_error_reopens_the_upload(self):
+        url = self.start_export(self.photo_export(1))
+        with mock.patch('api.views.save_photos', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.client.post(url + 'complete/')
+        self.assertEqual(self.client.get(url).json()['status'], 'uploading')
+
+    def test_total_size_limit(self):
+        with mock.patch('api.views.CHUNKED_UPLOAD_MAX_SIZE', 100):
+            response = self.client.post('/api/chunked-uploads/', {
+                'filename': 'face.jpg', 'total_size': 101, 'target': 'foto', 'image_type': 'jpg',
+            })
+        self.assertEqual(response.status_code, 400)
+
+
+class WeightCsvRowParserTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            generators.weight_csv(f.name, 20, random.Random(0))
+            # A multi-byte character, to split it across chunks too
+            cls.csv = f.read().replace(b'Metadata line 1', b'Gebruiker: Zo\xc3\xab')
+
+    @staticmethod
+    def reference_rows(data):
+        """The rows as upload_weight_csv reads an already stored file."""
+        text = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+        for _ in range(WEIGHT_CSV_METADATA_LINES):
+            next(text)
+        return list(csv.DictReader(text, delimiter=';'))
+
+    @staticmethod
+    def parse(data, chunk_size):
+        parser = WeightCsvRowParser()
+        for start in range(0, len(data), chunk_size):
+            parser.feed(data[start:start + chunk_size])
+        parser.feed(b'', final=True)
+        return parser.rows
+
+    def assertParses(self, data):
+        expected = self.reference_rows(data)
+        self.assertEqual(len(expected), 20)
+        for chunk_size in (1, 2, 3, 7, 64, len(data)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.parse(data, chunk_size), expected)
+
+    def test_lf(self):
+        self.assertParses(self.csv)
+
+    def test_crlf(self):
+        data = self.csv.replace(b'\n', b'\r\n')
+        self.assertParses(data)
+        self.assertNotIn('\r', ''.join(self.parse(data, 7)[-1].values()))
+
+    def test_without_final_newline(self):
+        self.assertParses(self.csv.rstrip(b'\n'))
+        self.assertParses(self.csv.replace(b'\n', b'\r\n').rstrip(b'\r\n'))
+
+
+class FastJSONRendererTests(TestCase):
+    def test_same_bytes_as_drf_for_api_responses(self):
+        user = CustomUser.objects.create(username='zoë', email='zoë@example.com', role='U')
+        seed_images(user, 20)
+        seed_weight(user, 20)
+        self.client.force_login(user)
+
+        for url in ('/api/weight-data/', '/api/list_uploaded_fotos/', '/api/minmaxavg/', '/api/userinfo/',
+                    '/api/latest-datetime/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_same_bytes_for_edge_values(self):
+        data = {'text': 'zoë <\u2028\u2029>', 1: None, 'when': timezone.now(), 'big': 2 ** 70, 'nested': [(1, 2.5)]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class ReadSerializerTests(TestCase):
+    """The values()-based read serializers give the same JSON as the ModelSerializers they replace."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='user', role='U')
+
+    def assertSameJSON(self, fast, model):
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(model))
+
+    def test_extracted_image(self):
+        seed_images(self.user, 2)
+        ExtractedImage.objects.create(user=self.user, medewerker_number='', image='images_user/foto met é.jpg',
+                                      original_filename=None, image_type=None, image_size=None)
+        ExtractedImage.objects.create(user=self.user, medewerker_number='', image='')
+        qs = ExtractedImage.objects.select_related('user').order_by('id')
+
+        for request in (RequestFactory().get('/api/list_uploaded_fotos/'), None):
+            for time_zone in ('UTC', 'Europe/Amsterdam'):
+                with self.subTest(request=request, time_zone=time_zone), override_settings(TIME_ZONE=time_zone):
+                    self.assertSameJSON(
+                        ExtractedImageReadSerializer(request).serialize(qs.values(*ExtractedImageReadSerializer.values_fields)),
+                        ExtractedImageSerializer(qs, many=True, context={'request': request}).data,
+                    )
+
+    def test_weight_measurement(self):
+        seed_weight(self.user, 20)
+        WeightMeasurement.objects.create(user=self.user, date=datetime.date(2024, 1, 1), weight_kg=80, bone_mass='3.5',
+                                         body_fat='0.01', body_water=55, muscle_mass='-1.25', bmi='999.99')
+        qs = WeightMeasurement.objects.order_by('id')
+        self.assertSameJSON(
+            WeightMeasurementReadSerializer().serialize(qs.values(*WeightMeasurementReadSerializer.values_fields)),
+            WeightMeasurementsSerializer(qs, many=True).data,
+        )
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='user', role='U')
+        seed_images(self.user, 5)
+        seed_weight(self.user, 5)
+        self.client.force_login(self.user)
+
+    def assertChangesETag(self, url, change):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        change()
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_weight_data_in_place_update(self):
+        def change():
+            # As upload_weight_csv does for a date that is already stored
+            measurement = WeightMeasurement.objects.earliest('date')
+            WeightMeasurement.objects.update_or_create(user=self.user, date=measurement.date,
+                                                       defaults={'weight_kg': measurement.weight_kg + 1})
+
+        self.assertChangesETag('/api/weight-data/', change)
+
+    def test_minmaxavg_in_place_update(self):
+        def change():
+            measurement = WeightMeasurement.objects.earliest('date')
+            measurement.weight_kg += 1
+            measurement.save()
+
+        self.assertChangesETag('/api/minmaxavg/', change)
+
+    def test_list_uploaded_fotos_in_place_update(self):
+        def change():
+            image = ExtractedImage.objects.first()
+            image.medewerker_number = 'changed'
+            image.save()
+
+        self.assertChangesETag('/api/list_uploaded_fotos/', change)
+
+
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.dict(slow_queries._last_stored, clear=True))
+
+    def record(self):
+        slow_queries.record(connection, 'SELECT %s', ['secret'], 5.0)
+        return SlowQuery.objects.get()
+
+    def test_params_are_not_stored_by_default(self):
+        stored = self.record()
+        self.assertEqual((stored.sql, stored.params), ('SELECT %s', ''))
+
+    def test_params_are_stored_when_enabled(self):
+        with mock.patch.object(slow_queries, 'STORE_PARAMS', True):
+            self.assertEqual(self.record().params, "['secret']")
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profile_root = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_root.cleanup)
+        self.enterContext(mock.patch.object(
+            RequestProfile._meta.get_field('file'), 'storage', FileSystemStorage(profile_root.name)))
+        self.enterContext(override_settings(API_PROFILING_ENABLED=True))
+        self.admin = CustomUser.objects.create(username='admin', role='A')
+
+    def profiled_functions(self, response):
+        """(file name, function name) of everything in the request's cProfile dump."""
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        with profile.file.open('rb') as f:
+            stats = marshal.load(f)
+        return {(os.path.basename(filename), function) for filename, _line, function in stats}
+
+    def test_profile_covers_view(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/api/userinfo/', headers={'X-Profile': 'cprofile'})
+        self.assertIn(('views.py', 'get'), self.profiled_functions(response))
+
+    async def test_async_profile_covers_sync_view(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get('/api/userinfo/', headers={'X-Profile': 'cprofile'})
+        functions = await sync_to_async(self.profiled_functions)(response)
+        self.assertIn(('views.py', 'get'), functions)
+
+
+class MetricsTests(TestCase):
+    def test_forked_child_keeps_its_first_values(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = Registry(directory)
+            counter = registry.counter('test_total', 'Test')
+            counter.inc()  # the parent's, not to be reported by the child
+
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    counter.inc(5)
+                    registry.flush(force=True)
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+
+            self.assertEqual(registry.collect()['test_total'], {(): 6})
+
+    def test_media_bytes_are_the_stored_size(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.client.force_login(CustomUser.objects.create(username='user', role='U'))
+
+        before = metrics.registry.collect().get('api_media_bytes_written_total', {}).get(('upload_foto',), 0)
+        upload = SimpleUploadedFile('face.jpg', b'\xff\xd8' + b'x' * 1000, content_type='image/jpeg')
+        self.client.post('/api/upload-foto/', {'file': upload, 'image_type': 'jpg', 'image_size': 1})
+        after = metrics.registry.collect()['api_media_bytes_written_total'][('upload_foto',)]
+        self.assertEqual(after - before, 1002)
+
+
+class WeightImportTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='user', role='U')
+        self.other = CustomUser.objects.create(username='other', role='U')
+        self.client.force_login(self.user)
+
+    def upload(self, rows):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            generators.weight_csv(f.name, rows, random.Random(0))
+            upload = SimpleUploadedFile('weight.csv', f.read(), content_type='text/csv')
+        return self.client.post('/api/upload-csv/', {'file': upload})
+
+    def test_rows_belong_to_the_uploader(self):
+        self.assertEqual(self.upload(10).status_code, 200)
+        self.assertEqual(WeightMeasurement.objects.filter(user=self.user).count(), 10)
+        self.assertFalse(WeightMeasurement.objects.filter(user=self.other).exists())
+
+    def test_only_the_uploaders_rows_are_skipped(self):
+        # Another user's later measurement doesn't hide this user's rows
+        WeightMeasurement.objects.create(user=self.other, date=datetime.date(2100, 1, 1), weight_kg=80, bone_mass=4,
+                                         body_fat=20, body_water=55, muscle_mass=40, bmi=23)
+        self.upload(10)
+        self.assertEqual(WeightMeasurement.objects.filter(user=self.user).count(), 10)
+
+        # Uploading the same export again adds nothing
+        self.upload(10)
+        self.assertEqual(WeightMeasurement.objects.filter(user=self.user).count(), 10)
+
+    def test_latest_datetime_is_the_users_own(self):
+        self.assertEqual(self.client.get('/api/latest-datetime/').json(), {'date': None})
+        seed_weight(self.user, 5)
+        WeightMeasurement.objects.create(user=self.other, date=datetime.date(2100, 1, 1), weight_kg=80, bone_mass=4,
+                                         body_fat=20, body_water=55, muscle_mass=40, bmi=23)
+        latest = WeightMeasurement.objects.filter(user=self.user).latest('date').date
+        self.assertEqual(self.client.get('/api/latest-datetime/').json(), {'date': latest.isoformat()})
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_upload_fotos_rate_counts_photos(self):
+        result = run_benchmark('upload_fotos', '1k', repeat=1, warmup=0, memory=False)
+        self.assertEqual(result['rows'], 10)
+        self.assertAlmostEqual(result['rows_per_s'], 10 / result['median_s'])
@@ -0,0 +1,144 @@
+"""
+Per-request timing, reported as Server-Timing headers and logged to the 'api' logger.
+
+Enabled with API_SERVER_TIMING = True. ServerTimingMiddleware then collects
+for every request:
+
+- db: number of queries and time spent in them (a wrapper installed on every
+  database connection);
+- parse, serialize, storage, ...: time spent inside `timer(name)` blocks.
+
+    from api.timing import timer
+
+    with timer('parse'):
+        rows = parse_file(file, file.name)
+
+Outside a timed request (setting off, management commands) `timer` and
+`record` do nothing.
+"""
+
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.storage import FileSystemStorage
+
+logger = logging.getLogger('api')
+
+# name -> [count, seconds] for the current request, None when not timing
+_timings = ContextVar('api_timings', default=None)
+
+
+def record(name, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+@contextmanager
+def timer(name):
+    if _timings.get() is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record(name, perf_counter() - start)
+
+
+def db_timer(execute, sql, params, many, context):
+    """Database execute wrapper, see install_db_timer."""
+    if _timings.get() is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record('db', perf_counter() - start)
+
+
+def install_db_timer(sender, connection, **kwargs):
+    """connection_created receiver, connected in ApiConfig.ready when timing is enabled."""
+    if db_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_timer)
+
+
+class TimedFileSystemStorage(FileSystemStorage):
+    """FileSystemStorage that reports its I/O as 'storage' time (used when API_SERVER_TIMING is on)."""
+
+    def _open(self, name, mode='rb'):
+        with timer('storage'):
+            return super()._open(name, mode)
+
+    def _save(self, name, content):
+        with timer('storage'):
+            return super()._save(name, content)
+
+    def delete(self, name):
+        with timer('storage'):
+            return super().delete(name)
+
+
+def server_timing_header(timings, total):
+    metrics = []
+    for name, (count, seconds) in timings.items():
+        desc = f';desc="{count} queries"' if name == 'db' else ''
+        metrics.append(f'{name};dur={seconds * 1000:.1f}{desc}')
+    metrics.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(metrics)
+
+
+class ServerTimingMiddleware:
+    """Time every request; see the module docstring. Removed from the stack when the setting is off."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_SERVER_TIMING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _timings.set({})
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response, _timings.get(), perf_counter() - start)
+        finally:
+            _timings.reset(token)
+
+    async def __acall__(self, request):
+        token = _timings.set({})
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response, _timings.get(), perf_counter() - start)
+        finally:
+            _timings.reset(token)
+
+    def finish(self, request, response, timings, total):
+        response['Server-Timing'] = server_timing_header(timings, total)
+
+        log_record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+        }
+        for name, (count, seconds) in timings.items():
+            log_record[f'{name}_ms'] = round(seconds * 1000, 1)
+            log_record[f'{name}_count'] = count
+        logger.info('timing %s', json.dumps(log_record), extra={'timing': log_record})
+        return response
@@ -0,0 +1,139 @@
+"""
+Upload handlers that handle every byte of an upload once, where it ends up.
+
+Django's default handlers buffer small files in memory and large ones in
+FILE_UPLOAD_TEMP_DIR, after which the views copied them again. These
+handlers are installed per endpoint through the parser classes below:
+
+- photos are spooled to a temp file on the MEDIA_ROOT filesystem, so
+  storage.save() renames it into place instead of copying it;
+- weight scale CSVs are parsed row by row while the body is received.
+"""
+
+import codecs
+import csv
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, TemporaryFileUploadHandler
+from rest_framework.parsers import MultiPartParser
+
+from .timing import timer
+
+# Lines before the header row in the weight scale export
+WEIGHT_CSV_METADATA_LINES = 9
+
+
+def media_temp_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'temp')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class MediaTemporaryUploadedFile(TemporaryUploadedFile):
+    """ TemporaryUploadedFile that lives next to MEDIA_ROOT instead of in FILE_UPLOAD_TEMP_DIR."""
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix=".upload" + ext, dir=media_temp_dir())
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+
+
+class MediaFileUploadHandler(TemporaryFileUploadHandler):
+    """ Always stream to disk on the media filesystem, whatever the file size."""
+
+    def new_file(self, *args, **kwargs):
+        FileUploadHandler.new_file(self, *args, **kwargs)
+        self.file = MediaTemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+
+
+class LocalFile(File):
+    """ A file on the media filesystem that storage may move into place instead of copying."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class WeightCsvRowParser:
+    """ Incremental parser for the weight scale CSV (metadata lines, then a ';' separated table)."""
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.pending = ''
+        self.lines_seen = 0
+        self.header = None
+        self.rows = []
+
+    def feed(self, data, final=False):
+        text = self.pending + self.decoder.decode(data, final=final)
+        lines = text.split('\n')
+        self.pending = '' if final else lines.pop()
+
+        table_lines = []
+        for line in lines:
+            self.lines_seen += 1
+            if self.lines_seen <= WEIGHT_CSV_METADATA_LINES:
+                continue
+            line = line.rstrip('\r')
+            if self.header is None:
+                self.header = next(csv.reader([line], delimiter=';'))
+            else:
+                table_lines.append(line)
+
+        if table_lines:
+            self.rows.extend(csv.DictReader(table_lines, fieldnames=self.header, delimiter=';'))
+
+
+class ParsedCsvFile(UploadedFile):
+    """ Stand-in for an uploaded CSV that was parsed on arrival; the rows are in `.rows`."""
+
+    def __init__(self, rows, name, content_type, size, charset, content_type_extra=None):
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+        self.rows = rows
+
+    def close(self):
+        # Nothing to close: the upload was never stored
+        pass
+
+
+class WeightCsvUploadHandler(FileUploadHandler):
+    """ Parse the weight CSV while it is received instead of storing it first."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.parser = WeightCsvRowParser()
+
+    def receive_data_chunk(self, raw_data, start):
+        with timer('parse'):
+            self.parser.feed(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        with timer('parse'):
+            self.parser.feed(b'', final=True)
+        return ParsedCsvFile(
+            self.parser.rows, self.file_name, self.content_type, file_size, self.charset, self.content_type_extra
+        )
+
+
+class HandlerMultiPartParser(MultiPartParser):
+    """ MultiPartParser that uses `upload_handler_classes` instead of FILE_UPLOAD_HANDLERS."""
+    upload_handler_classes = ()
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request._request.upload_handlers = [cls(request._request) for cls in self.upload_handler_classes]
+        return super().parse(stream, media_type, parser_context)
+
+
+class MediaFileMultiPartParser(HandlerMultiPartParser):
+    upload_handler_classes = (MediaFileUploadHandler,)
+
+
+class WeightCsvMultiPartParser(HandlerMultiPartParser):
+    upload_handler_classes = (WeightCsvUploadHandler,)
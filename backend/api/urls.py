@@ -1,12 +1,18 @@
 from django.urls import path
-from .views import (text_to_image, LoginView, LogoutView, upload_foto,
-                    upload_fotos, UserInfoView, list_uploaded_fotos, weight_measurement_list,
-                    upload_weight_csv, latest_measurement_datetime, get_minmaxavg)
+from .views import (text_to_image, LoginView, LogoutView, TokenView, upload_foto,
+                    upload_fotos, upload_foto_async, upload_fotos_async,
+                    chunked_upload_start, chunked_upload_chunk, chunked_upload_complete, UserInfoView, list_uploaded_fotos, weight_measurement_list,
+                    upload_weight_csv, latest_measurement_datetime, get_minmaxavg, prometheus_metrics)
 
 urlpatterns = [
     path("text-to-image/", text_to_image, name="text_to_image"),
     path('upload-foto/', upload_foto, name="upload_foto"),
     path('upload-fotos/', upload_fotos, name="upload_fotos"),
+    path('async/upload-foto/', upload_foto_async, name="upload_foto_async"),
+    path('async/upload-fotos/', upload_fotos_async, name="upload_fotos_async"),
+    path('chunked-uploads/', chunked_upload_start, name="chunked_upload_start"),
+    path('chunked-uploads/<uuid:upload_id>/', chunked_upload_chunk, name="chunked_upload_chunk"),
+    path('chunked-uploads/<uuid:upload_id>/complete/', chunked_upload_complete, name="chunked_upload_complete"),
     path('list_uploaded_fotos/', list_uploaded_fotos, name="list_uploaded_fotos"),
     path('upload-csv/', upload_weight_csv, name='upload-weight-csv'),
     path('weight-data/', weight_measurement_list, name='userinfo'),
@@ -15,4 +21,6 @@ urlpatterns = [
     path('userinfo/', UserInfoView.as_view(), name='userinfo'),
     path('login/', LoginView.as_view(), name='api-login'),
     path('logout/', LogoutView.as_view(), name='api-logout'),
+    path('token/', TokenView.as_view(), name='api-token'),
+    path('metrics/', prometheus_metrics, name='metrics'),
 ]
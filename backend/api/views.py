@@ -1,36 +1,50 @@
+import asyncio
 import io
 import os
-import shutil
 import uuid
 import datetime
 import base64
 import zipfile
 import csv
+import hashlib
 import logging
+import shutil
+import tempfile
 
 from io import TextIOWrapper
+from asgiref.sync import sync_to_async
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny
 from django.contrib.auth import authenticate, login, logout
 from django.utils.decorators import method_decorator
 from rest_framework.views import APIView
 from rest_framework import status
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
 from rest_framework.decorators import parser_classes
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
 from PIL import Image, ImageDraw, ImageFont
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 import xml.etree.ElementTree as ET
 
-from .serializers import ExtractedImageSerializer, WeightMeasurementsSerializer
-from .authentication import BearerAuthentication
-from .models import ExtractedImage, WeightMeasurement
+from .serializers import ExtractedImageSerializer, ExtractedImageReadSerializer, WeightMeasurementReadSerializer
+from .conditional import make_etag, not_modified, queryset_marker, set_etag
+from .metrics import WEIGHT_ROWS_IMPORTED, record_photos, registry
+from .timing import timer
+from .authentication import (ACCESS_TOKEN_MAX_AGE, BearerAuthentication, SignedTokenAuthentication,
+                             async_authentication, issue_access_token)
+from .upload_handlers import (WEIGHT_CSV_METADATA_LINES, LocalFile, MediaFileMultiPartParser,
+                              WeightCsvMultiPartParser)
+from .models import ChunkedUpload, ExtractedImage, WeightMeasurement
 
 
 logger = logging.getLogger('api')
@@ -60,6 +74,29 @@ class LoginView(APIView):
             return Response({'detail': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
 
+class TokenView(APIView):
+    """
+    POST /api/token/ with username and password.
+    Returns a short-lived signed access token for the `Authorization: Token <token>` header.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        username = request.data.get('username')
+        password = request.data.get('password')
+
+        user = authenticate(request, username=username, password=password)
+        if user is None:
+            return Response({'detail': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        return Response({
+            'access': issue_access_token(user),
+            'token_type': SignedTokenAuthentication.keyword,
+            'expires_in': ACCESS_TOKEN_MAX_AGE,
+        })
+
+
 class UserInfoView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -74,7 +111,7 @@ class UserInfoView(APIView):
 
 
 class LogoutView(APIView):
-    authentication_classes = [SessionAuthentication, BearerAuthentication]
+    authentication_classes = [SessionAuthentication, BearerAuthentication, SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -82,7 +119,7 @@ class LogoutView(APIView):
         return Response({'detail': 'Logged out succesfully'})
 
 
-@authentication_classes([BearerAuthentication, SessionAuthentication])
+@authentication_classes([BearerAuthentication, SessionAuthentication, SignedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def text_to_image(request):
     user = request.user
@@ -137,57 +174,23 @@ def find_child_case_insensitive(elem, tag_candidate):
     return None
 
 
-@api_view(['POST'])
-@ensure_csrf_cookie
-@authentication_classes([SessionAuthentication])
-@permission_classes([IsAuthenticated])
-@parser_classes([MultiPartParser])
-def upload_fotos(request):
-    file_obj = request.FILES.get('file')
-    zippassw = request.POST.get('zip-passw')
-    xml_content = None
-
-    if not file_obj:
-        return JsonResponse({"error": "No file provided"}, status=400)
-
-    # --- Handle ZIP uploads ---
-    if file_obj.name.lower().endswith('.zip'):
-        if not zippassw:
-            return JsonResponse({"error": "ZIP password is required for ZIP files"}, status=400)
-
-        temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp', str(uuid.uuid4()))
-        os.makedirs(temp_dir, exist_ok=True)
-
-        try:
-            zip_path = os.path.join(temp_dir, file_obj.name)
-            with open(zip_path, 'wb') as f:
-                for chunk in file_obj.chunks():
-                    f.write(chunk)
-
-            with zipfile.ZipFile(zip_path) as zf:
-                try:
-                    zf.extractall(path=temp_dir, pwd=zippassw.encode())
-                except (zipfile.BadZipfile, RuntimeError):
-                    return JsonResponse({"error": "Invalid ZIP file or wrong password"}, status=400)
-
-            xml_files = [f for f in os.listdir(temp_dir) if f.lower().endswith('.xml')]
+def extract_xml_from_zip(file_obj, zippassw):
+    """ Return the content of the first XML file in a password protected ZIP upload.
+        The archive is read in place, nothing is extracted to disk.
+        Raises ValueError with a message for the client when that is not possible."""
+    try:
+        with zipfile.ZipFile(file_obj) as zf:
+            xml_files = [n for n in zf.namelist() if '/' not in n and n.lower().endswith('.xml')]
             if not xml_files:
-                return JsonResponse({"error": "No XML file found in the ZIP archive"}, status=400)
+                raise ValueError("No XML file found in the ZIP archive")
+            return zf.read(xml_files[0], pwd=zippassw.encode())
+    except (zipfile.BadZipfile, RuntimeError):
+        raise ValueError("Invalid ZIP file or wrong password")
 
-            xml_path = os.path.join(temp_dir, xml_files[0])
-            with open(xml_path, 'rb') as f:
-                xml_content = f.read()
-        finally:
-            shutil.rmtree(temp_dir, ignore_errors=True)
 
-    # --- Parse XML content ---
-    if xml_content:
-        tree = ET.parse(io.BytesIO(xml_content))
-    else:
-        tree = ET.parse(file_obj)
-    root = tree.getroot()
-
-    saved_images = []
+def iter_photos(xml_source):
+    """ Yield (medewerker_number, img_bytes, image_type) for every photo in the XML export."""
+    root = ET.parse(xml_source).getroot()
 
     # --- Iterate through koppeling_medewerkers_fotos elements ---
     for koppeling_elem in root.iter():
@@ -216,28 +219,114 @@ def upload_fotos(request):
             else:
                 image_type = 'jpg'
 
-            image_size = len(img_bytes)
-            filename = f"{request.user.username}_{medewerker_number}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.{image_type}"
+            yield medewerker_number, img_bytes, image_type
+
+
+def photo_filename(username, medewerker_number, image_type):
+    return f"{username}_{medewerker_number}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.{image_type}"
+
+
+def save_photos(user, xml_source):
+    """ Store every photo of an XML export as an ExtractedImage of the user.
+        When the export turns out to be broken halfway (ET.ParseError, storage errors)
+        the files stored so far are removed again; callers roll back the rows."""
+    saved_images = []
+    try:
+        for medewerker_number, img_bytes, image_type in iter_photos(xml_source):
+            filename = photo_filename(user.username, medewerker_number, image_type)
 
             extracted = ExtractedImage.objects.create(
-                user=request.user,
+                user=user,
                 medewerker_number=medewerker_number,
                 image=ContentFile(img_bytes, name=filename),
                 original_filename=filename,
                 image_type=image_type,
-                image_size=image_size,
+                image_size=len(img_bytes),
             )
 
             saved_images.append(extracted)
+    except Exception:
+        for extracted in saved_images:
+            extracted.image.delete(save=False)
+        raise
+    return saved_images
+
+
+@api_view(['POST'])
+@ensure_csrf_cookie
+@authentication_classes([SessionAuthentication, SignedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+@parser_classes([MediaFileMultiPartParser])
+def upload_fotos(request):
+    file_obj = request.FILES.get('file')
+    zippassw = request.POST.get('zip-passw')
+    xml_content = None
+
+    if not file_obj:
+        return JsonResponse({"error": "No file provided"}, status=400)
+
+    # --- Handle ZIP uploads ---
+    if file_obj.name.lower().endswith('.zip'):
+        if not zippassw:
+            return JsonResponse({"error": "ZIP password is required for ZIP files"}, status=400)
+        try:
+            with timer('parse'):
+                xml_content = extract_xml_from_zip(file_obj, zippassw)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+    # --- Parse XML content ---
+    xml_source = io.BytesIO(xml_content) if xml_content else file_obj
+    saved_images = save_photos(request.user, xml_source)
+    record_photos('upload_fotos', saved_images)
 
     serializer = ExtractedImageSerializer(saved_images, many=True, context={'request': request})
     return Response(serializer.data)
 
 
+def render_response(data):
+    """ Response for the plain async views, encoded by the same renderer as the DRF views."""
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return HttpResponse(renderer.render(data), content_type=renderer.media_type)
+
+
+@require_POST
+@async_authentication
+async def upload_fotos_async(request):
+    """ Async (ASGI) variant of upload_fotos. ZIP extraction, XML/base64 decoding and
+        storing the photos run off the event loop so it keeps serving other uploads."""
+    # Multipart parsing writes large files to disk, keep it off the event loop
+    files = await sync_to_async(lambda: request.FILES)()
+    file_obj = files.get('file')
+    zippassw = request.POST.get('zip-passw')
+    xml_content = None
+
+    if not file_obj:
+        return JsonResponse({"error": "No file provided"}, status=400)
+
+    if file_obj.name.lower().endswith('.zip'):
+        if not zippassw:
+            return JsonResponse({"error": "ZIP password is required for ZIP files"}, status=400)
+        try:
+            with timer('parse'):
+                loop = asyncio.get_running_loop()
+                xml_content = await loop.run_in_executor(None, extract_xml_from_zip, file_obj, zippassw)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+    # Each photo is decoded and stored before the next one, so only one is in memory at a time
+    xml_source = io.BytesIO(xml_content) if xml_content else file_obj
+    saved_images = await sync_to_async(save_photos)(request.user, xml_source)
+    record_photos('upload_fotos_async', saved_images)
+
+    serializer = ExtractedImageSerializer(saved_images, many=True, context={'request': request})
+    return render_response(serializer.data)
+
+
 @api_view(['POST'])
-@authentication_classes([SessionAuthentication])
+@authentication_classes([SessionAuthentication, SignedTokenAuthentication])
 @permission_classes([IsAuthenticated])
-@parser_classes([MultiPartParser])
+@parser_classes([MediaFileMultiPartParser])
 def upload_foto(request):
     file_obj = request.FILES.get('file')
     image_type = request.POST.get('image_type')
@@ -256,24 +345,260 @@ def upload_foto(request):
 
     original_filename = file_obj.name
 
-    # Use the filename as-is (trusting frontend)
-    filename_to_save = original_filename
-
-    # Save image content
-    img_bytes = file_obj.read()
-
+    # The upload is already a temp file on the media filesystem (MediaFileMultiPartParser),
+    # so storage moves it into place under its own name (trusting frontend)
     extracted = ExtractedImage.objects.create(
         user=request.user,
         medewerker_number='',
-        image=ContentFile(img_bytes, name=filename_to_save),
+        image=file_obj,
         original_filename=original_filename,
         image_type=image_type,
         image_size=image_size,
     )
+    record_photos('upload_foto', [extracted])
+
+    serializer = ExtractedImageSerializer(extracted, context={'request': request})
+
+    return Response(serializer.data)
+
+
+@require_POST
+@async_authentication
+async def upload_foto_async(request):
+    """ Async (ASGI) variant of upload_foto."""
+    files = await sync_to_async(lambda: request.FILES)()
+    file_obj = files.get('file')
+    image_type = request.POST.get('image_type')
+    image_size = request.POST.get('image_size')
+
+    if not file_obj:
+        return JsonResponse({"error": "No file provided"}, status=400)
+
+    if not image_type or not image_size:
+        return JsonResponse({"error": "image_type and image_size are required"}, status=400)
+
+    try:
+        image_size = int(image_size)
+    except ValueError:
+        return JsonResponse({"error": "Invalid image_size"}, status=400)
+
+    extracted = ExtractedImage(
+        user=request.user,
+        medewerker_number='',
+        original_filename=file_obj.name,
+        image_type=image_type,
+        image_size=image_size,
+    )
+    # Storage copies the upload (a temp file for large ones) in chunks, in a thread
+    name = extracted.image.field.generate_filename(extracted, file_obj.name)
+    extracted.image.name = await sync_to_async(extracted.image.storage.save)(name, file_obj)
+    await extracted.asave()
+    record_photos('upload_foto_async', [extracted])
 
     serializer = ExtractedImageSerializer(extracted, context={'request': request})
+    return render_response(serializer.data)
+
+
+# Bytes read from the request / file per step while streaming chunks
+CHUNK_READ_SIZE = 64 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+
 
-    return JsonResponse(serializer.data)
+def _chunked_upload_state(upload):
+    return {
+        'id': str(upload.id),
+        'filename': upload.filename,
+        'target': upload.target,
+        'offset': upload.offset,
+        'total_size': upload.total_size,
+        'status': upload.status,
+    }
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@api_view(['POST'])
+@authentication_classes([SessionAuthentication, SignedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def chunked_upload_start(request):
+    """ Initiate a resumable upload.
+        POST {filename, total_size, target: 'fotos'|'foto', image_type (for 'foto')}"""
+    filename = request.data.get('filename')
+    target = request.data.get('target')
+    image_type = request.data.get('image_type')
+
+    try:
+        total_size = int(request.data.get('total_size'))
+    except (TypeError, ValueError):
+        return Response({'error': 'total_size must be an integer'}, status=400)
+
+    if not filename or total_size <= 0:
+        return Response({'error': 'filename and a positive total_size are required'}, status=400)
+    if total_size > CHUNKED_UPLOAD_MAX_SIZE:
+        return Response({'error': f'total_size is larger than {CHUNKED_UPLOAD_MAX_SIZE} bytes'}, status=400)
+    if target not in dict(ChunkedUpload.TARGET_CHOICES):
+        return Response({'error': f"target must be one of {list(dict(ChunkedUpload.TARGET_CHOICES))}"}, status=400)
+    if target == 'foto' and not image_type:
+        return Response({'error': 'image_type is required for single photos'}, status=400)
+
+    upload = ChunkedUpload.objects.create(
+        user=request.user,
+        filename=os.path.basename(filename),
+        target=target,
+        image_type=image_type,
+        total_size=total_size,
+    )
+    os.makedirs(os.path.dirname(upload.path), exist_ok=True)
+    open(upload.path, 'wb').close()
+
+    return Response(_chunked_upload_state(upload), status=201)
+
+
+@api_view(['GET', 'PUT'])
+@authentication_classes([SessionAuthentication, SignedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def chunked_upload_chunk(request, upload_id):
+    """ GET: current offset to resume from.
+        PUT: append the raw request body at X-Chunk-Offset; X-Chunk-SHA256 (hex) is verified
+        before the offset moves, so a corrupted chunk is simply sent again."""
+    upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+    if request.method == 'GET':
+        return Response(_chunked_upload_state(upload))
+
+    if upload.status != 'uploading':
+        return Response({'error': 'Upload is already complete'}, status=400)
+
+    try:
+        offset = int(request.headers.get('X-Chunk-Offset', ''))
+    except ValueError:
+        return Response({'error': 'X-Chunk-Offset header is required'}, status=400)
+    checksum = request.headers.get('X-Chunk-SHA256', '').lower()
+    if not checksum:
+        return Response({'error': 'X-Chunk-SHA256 header is required'}, status=400)
+
+    if offset != upload.offset:
+        return Response({'error': 'Offset mismatch', **_chunked_upload_state(upload)}, status=409)
+
+    # Receive the body into a temp file next to the part file first: the row is only
+    # locked for the short local append below, not while a slow client sends the chunk
+    digest = hashlib.sha256()
+    written = 0
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(upload.path), suffix='.chunk') as chunk:
+        for block in iter(lambda: request._request.read(CHUNK_READ_SIZE), b''):
+            if offset + written + len(block) > upload.total_size:
+                return Response({'error': 'Chunk exceeds total_size'}, status=400)
+            chunk.write(block)
+            digest.update(block)
+            written += len(block)
+
+        if digest.hexdigest() != checksum:
+            return Response({'error': 'Checksum mismatch, resend the chunk', **_chunked_upload_state(upload)}, status=400)
+
+        with transaction.atomic():
+            upload = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+            # Another request may have appended (or completed) while this chunk was received
+            if upload.status != 'uploading':
+                return Response({'error': 'Upload is already complete'}, status=400)
+            if offset != upload.offset:
+                return Response({'error': 'Offset mismatch', **_chunked_upload_state(upload)}, status=409)
+
+            chunk.seek(0)
+            with open(upload.path, 'r+b') as f:
+                f.seek(offset)
+                shutil.copyfileobj(chunk, f, CHUNK_READ_SIZE)
+            upload.offset = offset + written
+            upload.save(update_fields=['offset', 'updated_at'])
+
+    return Response(_chunked_upload_state(upload))
+
+
+class ChunkedUploadError(ValueError):
+    """ The assembled upload can't be imported as sent (checksum, ZIP password)."""
+
+
+def _reopen_chunked_upload(upload):
+    upload.status = 'uploading'
+    upload.save(update_fields=['status', 'updated_at'])
+
+
+def _import_chunked_upload(request, upload):
+    checksum = (request.data.get('sha256') or '').lower()
+    if checksum and _file_sha256(upload.path) != checksum:
+        raise ChunkedUploadError('Checksum mismatch for the assembled file')
+
+    with open(upload.path, 'rb') as f:
+        # The part file is on the media filesystem, so storage can move it into place
+        file_obj = LocalFile(f, name=upload.filename)
+
+        if upload.target == 'foto':
+            return [ExtractedImage.objects.create(
+                user=request.user,
+                medewerker_number='',
+                image=file_obj,
+                original_filename=upload.filename,
+                image_type=upload.image_type,
+                image_size=upload.total_size,
+            )]
+        else:
+            xml_source = f
+            if upload.filename.lower().endswith('.zip'):
+                zippassw = request.data.get('zip-passw')
+                if not zippassw:
+                    raise ChunkedUploadError("ZIP password is required for ZIP files")
+                try:
+                    with timer('parse'):
+                        xml_source = io.BytesIO(extract_xml_from_zip(file_obj, zippassw))
+                except ValueError as e:
+                    raise ChunkedUploadError(str(e)) from e
+            return save_photos(request.user, xml_source)
+
+
+@api_view(['POST'])
+@authentication_classes([SessionAuthentication, SignedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def chunked_upload_complete(request, upload_id):
+    """ Verify the assembled file and hand it to the regular photo import.
+        POST {sha256 (optional, whole file), zip-passw (for ZIP exports)}"""
+    # Claim the upload: of two concurrent requests only one moves it to 'complete' and imports it
+    with transaction.atomic():
+        upload = get_object_or_404(ChunkedUpload.objects.select_for_update(), id=upload_id, user=request.user)
+        if upload.status != 'uploading':
+            return Response({'error': 'Upload is already complete', **_chunked_upload_state(upload)}, status=409)
+        if upload.offset != upload.total_size:
+            return Response({'error': 'Upload is not complete yet', **_chunked_upload_state(upload)}, status=400)
+        upload.status = 'complete'
+        upload.save(update_fields=['status', 'updated_at'])
+
+    # Whatever goes wrong, nothing is imported and the upload is handed back, so the client can retry
+    try:
+        with transaction.atomic():
+            saved_images = _import_chunked_upload(request, upload)
+    except ChunkedUploadError as e:
+        _reopen_chunked_upload(upload)
+        return Response({'error': str(e)}, status=400)
+    except ET.ParseError as e:
+        _reopen_chunked_upload(upload)
+        return Response({'error': f'Invalid XML export: {e}'}, status=400)
+    except OSError:
+        logger.exception(f"Could not store the photos of chunked upload {upload.id}")
+        _reopen_chunked_upload(upload)
+        return Response({'error': 'Could not store the photos, complete the upload again'}, status=400)
+    except BaseException:
+        _reopen_chunked_upload(upload)
+        raise
+    record_photos('chunked_upload', saved_images)
+
+    if os.path.exists(upload.path):
+        os.remove(upload.path)
+
+    serializer = ExtractedImageSerializer(saved_images, many=True, context={'request': request})
+    return Response({**_chunked_upload_state(upload), 'images': serializer.data})
 
 
 @api_view(['GET'])
@@ -285,44 +610,51 @@ def list_uploaded_fotos(request):
 
     if user.role == 'A':
         # Admin: list all images with owner's username
-        queryset = ExtractedImage.objects.select_related('user').order_by('-created_at')
+        queryset = ExtractedImage.objects.order_by('-created_at')
     else:
         # Regular user: only own images
         queryset = ExtractedImage.objects.filter(user=user).order_by('-created_at')
 
-    paginated_qs = paginator.paginate_queryset(queryset, request)
-    serializer = ExtractedImageSerializer(paginated_qs, many=True, context={'request': request})
+    etag = make_etag(request, *queryset_marker(queryset))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
 
-    # For admin include the username in the response (if not in serializer, extend it)
+    rows = paginator.paginate_queryset(queryset.values(*ExtractedImageReadSerializer.values_fields), request)
+    data = ExtractedImageReadSerializer(request).serialize(rows)
+
+    # For admin include the owner's username in the response
     if user.role == 'A':
-        # add username manually if not present on serializer
-        data = serializer.data
-        for item, obj in zip(data, queryset):
-            item['owner_username'] = obj.user.username
-        return paginator.get_paginated_response(data)
+        for item in data:
+            item['owner_username'] = item['username']
 
-    return paginator.get_paginated_response(serializer.data)
+    return set_etag(paginator.get_paginated_response(data), etag)
 
 
 @api_view(['POST'])
-@authentication_classes([SessionAuthentication])
+@authentication_classes([SessionAuthentication, SignedTokenAuthentication])
 @permission_classes([IsAuthenticated])
+@parser_classes([WeightCsvMultiPartParser])
 def upload_weight_csv(request):
 
     file_obj = request.FILES.get('file')
     if not file_obj:
         return Response({'error': 'No file uploaded.'}, status=400)
 
-    csv_file = TextIOWrapper(file_obj.file, encoding='utf-8')
+    # Rows are parsed while the upload arrives (WeightCsvMultiPartParser), except for
+    # callers that pass an already uploaded file, such as the admin import
+    reader = getattr(file_obj, 'rows', None)
+    if reader is None:
+        csv_file = TextIOWrapper(file_obj.file, encoding='utf-8')
 
-    # Skip the first 9 metadata lines
-    for _ in range(9):
-        next(csv_file)
+        # Skip the first 9 metadata lines
+        for _ in range(WEIGHT_CSV_METADATA_LINES):
+            next(csv_file)
 
-    reader = csv.DictReader(csv_file, delimiter=";")
+        reader = csv.DictReader(csv_file, delimiter=";")
 
-    # Find the latest datetime in DB
-    latest_entry = WeightMeasurement.objects.order_by('-date').first()
+    # Find the latest date in DB for this user
+    latest_entry = WeightMeasurement.objects.filter(user=request.user).order_by('-date').first()
     latest_datetime = latest_entry.date if latest_entry else None
 
     count = 0
@@ -336,7 +668,7 @@ def upload_weight_csv(request):
             dt = datetime.datetime.strptime(datetime_str, '%m/%d/%Y - %H:%M')
 
             # If no entries in DB, import all rows
-            if latest_datetime and dt <= latest_datetime:
+            if latest_datetime and dt.date() <= latest_datetime:
                 logger.info(f"Skipping row with date {dt} because its <= latest DB date {latest_datetime}")
                 continue
 
@@ -348,6 +680,7 @@ def upload_weight_csv(request):
             bmi = float(row.get('BMI').strip() or 0)
 
             WeightMeasurement.objects.update_or_create(
+                user=request.user,
                 date=dt,
                 defaults={
                     'weight_kg': weight,
@@ -363,6 +696,7 @@ def upload_weight_csv(request):
             errors += 1
             logger.error(f"Error processing CSV row {row}: {e}", exc_info=True)
 
+    WEIGHT_ROWS_IMPORTED.inc(count)
     return Response({
         'message': f'Successfully processed {count} entries.',
         'errors': errors
@@ -370,7 +704,7 @@ def upload_weight_csv(request):
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication])
+@authentication_classes([SessionAuthentication, SignedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def weight_measurement_list(request):
 
@@ -378,6 +712,12 @@ def weight_measurement_list(request):
 
     queryset = WeightMeasurement.objects.filter(user=user).order_by('date')
 
+    # Count + max id catch added and removed rows, max updated_at catches rows the CSV import overwrites
+    etag = make_etag(request, *queryset_marker(queryset))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
     # Filtering
     date_gte = request.GET.get('date__gte')
     date_lte = request.GET.get('date__lte')
@@ -393,94 +733,55 @@ def weight_measurement_list(request):
 
     # Use the project's global paginator
     paginator = PageNumberPagination()  # DRF will inject DEFAULT_PAGINATION_CLASS settings
-    paginated_page = paginator.paginate_queryset(queryset, request)
+    rows = paginator.paginate_queryset(queryset.values(*WeightMeasurementReadSerializer.values_fields), request)
 
-    serializer = WeightMeasurementsSerializer(paginated_page, many=True)
-
-    return paginator.get_paginated_response(serializer.data)
+    return set_etag(paginator.get_paginated_response(WeightMeasurementReadSerializer().serialize(rows)), etag)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication])
+@authentication_classes([SessionAuthentication, SignedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def latest_measurement_datetime(request):
-    latest = WeightMeasurement.objects.order_by('-date').first()
+    latest = WeightMeasurement.objects.filter(user=request.user).order_by('-date').first()
     if latest:
-        return Response({'date': latest.datetime.isoformat()})
+        return Response({'date': latest.date.isoformat()})
     return Response({'date': None})
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication])
+@authentication_classes([SessionAuthentication, SignedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def get_minmaxavg(request):
     user = request.user
 
-    # get min, max and avg values for all the values of this user
-    total = {
-        'count': 0,
-        'weight_kg': 0,
-        'bone_mass': 0,
-        'body_fat': 0,
-        'body_water': 0,
-        'muscle_mass': 0,
-        'bmi': 0
-    }
-    min = {
-        'weight_kg': 1000,
-        'bone_mass': 100,
-        'body_fat': 100,
-        'body_water': 100,
-        'muscle_mass': 100,
-        'bmi': 1000
-    }
-    max = {
-        'weight_kg': 0,
-        'bone_mass': 0,
-        'body_fat': 0,
-        'body_water': 0,
-        'muscle_mass': 0,
-        'bmi': 0
-    }
-    measurements = WeightMeasurement.objects.filter(user=user)
-    for measurement in measurements:
-        for key in total.keys():
-            if key != 'count':
-                total[key] += getattr(measurement, key)
-                if getattr(measurement, key) < min[key]:
-                    min[key] = getattr(measurement, key)
-                if getattr(measurement, key) > max[key]:
-                    max[key] = getattr(measurement, key)
-            total['count'] += 1
-
-    print(total)
-    if total['count'] == 0:
-        return Response({'error': 'No measurements found for this user.'})
+    etag = make_etag(request, *queryset_marker(WeightMeasurement.objects.filter(user=user)))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    # get min, max and avg values for all the values of this user, in one query
+    fields = WeightMeasurementReadSerializer.decimal_fields
+    aggregates = {'count': Count('id')}
+    for field in fields:
+        aggregates[f'avg_{field}'] = Avg(field)
+        aggregates[f'min_{field}'] = Min(field)
+        aggregates[f'max_{field}'] = Max(field)
+    values = WeightMeasurement.objects.filter(user=user).aggregate(**aggregates)
+
+    if values['count'] == 0:
+        return set_etag(Response({'error': 'No measurements found for this user.'}), etag)
 
     results = {
-        'avg': {
-            'weight_kg': total['weight_kg']/total['count'],
-            'bone_mass': total['bone_mass']/total['count'],
-            'body_fat': total['body_fat']/total['count'],
-            'body_water': total['body_water']/total['count'],
-            'muscle_mass': total['muscle_mass']/total['count'],
-            'bmi': total['bmi']/total['count']
-        },
-        'min': {
-            'weight_kg': min['weight_kg'],
-            'bone_mass': min['bone_mass'],
-            'body_fat': min['body_fat'],
-            'body_water': min['body_water'],
-            'muscle_mass': min['muscle_mass'],
-            'bmi': min['bmi']
-        },
-        'max': {
-            'weight_kg': max['weight_kg'],
-            'bone_mass': max['bone_mass'],
-            'body_fat': max['body_fat'],
-            'body_water': max['body_water'],
-            'muscle_mass': max['muscle_mass'],
-            'bmi': max['bmi']
-        }
+        stat: {field: values[f'{stat}_{field}'] for field in fields}
+        for stat in ('avg', 'min', 'max')
     }
-    return Response({'minmaxavg': results})
+    return set_etag(Response({'minmaxavg': results}), etag)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def prometheus_metrics(request):
+    """ Request latency and import counters in the Prometheus text format (admins only)."""
+    if request.user.role != 'A':
+        return Response({'error': 'Only admins can read metrics.'}, status=403)
+    return HttpResponse(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
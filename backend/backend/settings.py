@@ -11,8 +11,11 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
+from importlib.util import find_spec
 import environ
 import os
+import tempfile
 
 env = environ.Env()
 environ.Env.read_env()
@@ -49,6 +52,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.timing.ServerTimingMiddleware',  # only active with API_SERVER_TIMING
+    'api.metrics.MetricsMiddleware',  # only active with METRICS_ENABLED
+    'api.budgets.QueryBudgetMiddleware',  # only active with API_QUERY_BUDGETS
+    'api.slow_queries.SlowQueryMiddleware',  # only active with API_SLOW_QUERY_MS
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -57,6 +64,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',  # only active with API_PROFILING_ENABLED
 ]
 
 if DEBUG:
@@ -133,16 +141,104 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': env("DATABASE_NAME"),
-        'USER': env("DATABASE_USER"),
-        'PASSWORD': env("DATABASE_PASSWORD"),
-        'HOST': env("DATABASE_HOST"),
-        'PORT': env("DATABASE_PORT")
+# DATABASE_ENGINE=sqlite runs without PostgreSQL, e.g. for local benchmarks
+# (python manage.py benchmark); DATABASE_NAME is then the database file.
+DATABASE_ENGINE = env("DATABASE_ENGINE", default="postgresql")
+
+if DATABASE_ENGINE == "sqlite":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': env("DATABASE_NAME", default=os.path.join(BASE_DIR, "db.sqlite3")),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': env("DATABASE_NAME"),
+            'USER': env("DATABASE_USER"),
+            'PASSWORD': env("DATABASE_PASSWORD"),
+            'HOST': env("DATABASE_HOST"),
+            'PORT': env("DATABASE_PORT")
+        }
+    }
+
+# Connection reuse
+# Opening a PostgreSQL connection costs more than the queries of small
+# endpoints such as userinfo/ and latest-datetime/, so connections are reused.
+# How depends on SERVER_MODE:
+# - "wsgi" (gunicorn, the default): every worker thread keeps its connection
+#   open for DATABASE_CONN_MAX_AGE seconds (60 outside DEBUG).
+# - "asgi" (uvicorn, for the async views): requests don't keep to one thread,
+#   and Django's docs say to disable persistent connections there. So
+#   CONN_MAX_AGE is 0 and psycopg's native pool is on by default.
+# DATABASE_POOL=True (needs psycopg-pool) selects the pool in either mode.
+# Django does not allow both, so CONN_MAX_AGE is forced to 0 when pooling.
+# Measure the gain on the production database, once per configuration:
+#   python manage.py bench_connections --username <user>
+
+SERVER_MODE = env("SERVER_MODE", default="wsgi")
+if SERVER_MODE not in ("wsgi", "asgi"):
+    raise ImproperlyConfigured(f'SERVER_MODE must be "wsgi" or "asgi", not "{SERVER_MODE}"')
+
+if env.bool("DATABASE_POOL", default=SERVER_MODE == "asgi") and DATABASE_ENGINE != "sqlite":
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': env.int("DATABASE_POOL_MIN_SIZE", default=2),
+            'max_size': env.int("DATABASE_POOL_MAX_SIZE", default=10),
+            'timeout': env.int("DATABASE_POOL_TIMEOUT", default=10),
+        }
     }
+else:
+    persistent = not DEBUG and SERVER_MODE == "wsgi"
+    DATABASES['default']['CONN_MAX_AGE'] = env.int("DATABASE_CONN_MAX_AGE", default=60 if persistent else 0)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = DATABASES['default']['CONN_MAX_AGE'] != 0
+
+
+# Cache
+# "locmem" is per process; "file" is shared by all workers on the host and
+# is required for the cached_db session backend outside DEBUG. The file cache
+# lives outside the source tree unless CACHE_LOCATION says otherwise.
+
+CACHE_BACKEND = env("CACHE_BACKEND", default="locmem")
+
+if CACHE_BACKEND == "file":
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': env("CACHE_LOCATION", default=os.path.join(tempfile.gettempdir(), "nsutils_cache")),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'nsutils',
+        }
+    }
+
+
+# Sessions
+# "db" reads django_session on every request, "cached_db" only on a cache
+# miss, "signed_cookies" never (the session lives in the cookie).
+# With "db" and "cached_db" expired rows stay in django_session; remove them
+# daily with Django's own command, scheduled next to cleanup_old_images:
+# 0 3 * * * python3 manage.py clearsessions
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
 }
+SESSION_BACKEND = env("SESSION_BACKEND", default="db")
+SESSION_ENGINE = SESSION_ENGINES[SESSION_BACKEND]
+
+# A per-process cache would keep serving a session on the other workers after
+# a logout on one of them; runserver (DEBUG) is a single process
+if SESSION_BACKEND == "cached_db" and CACHE_BACKEND != "file" and not DEBUG:
+    raise ImproperlyConfigured('SESSION_BACKEND "cached_db" needs the shared CACHE_BACKEND "file"')
 
 
 # Password validation
@@ -228,6 +324,40 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static/")
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, "media/")
 
+# Server-Timing headers and timing log records (db, parse, serialize, storage) per request.
+# Exposes internals to clients: meant for development and staging.
+API_SERVER_TIMING = env.bool("API_SERVER_TIMING", default=False)
+if API_SERVER_TIMING:
+    STORAGES = {
+        "default": {"BACKEND": "api.timing.TimedFileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+
+# Admins (role 'A') can profile a single request with `X-Profile: cprofile|sample[,memory]`
+# or `?_profile=...`; results are stored as RequestProfile (outside MEDIA_ROOT)
+API_PROFILING_ENABLED = env.bool("API_PROFILING_ENABLED", default=False)
+PROFILE_ROOT = env("PROFILE_ROOT", default=os.path.join(BASE_DIR, "profiles/"))
+
+# Prometheus-style metrics at /api/metrics/. With several processes (gunicorn workers,
+# cron commands) point METRICS_DIR at a directory they share, and clear it on (re)start.
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=True)
+METRICS_DIR = env("METRICS_DIR", default="")
+METRICS_FLUSH_INTERVAL = env.int("METRICS_FLUSH_INTERVAL", default=5)
+
+# Log requests that take more queries or time than their budget (api/budgets.py).
+# Meant for staging; the tests check the same budgets.
+API_QUERY_BUDGETS = env.bool("API_QUERY_BUDGETS", default=False)
+
+# Log and store (admin: Slow queries) queries slower than API_SLOW_QUERY_MS; 0 is off.
+# A fraction of them is stored with its EXPLAIN (ANALYZE, BUFFERS) plan, which runs
+# the query again.
+API_SLOW_QUERY_MS = env.float("API_SLOW_QUERY_MS", default=0)
+API_SLOW_QUERY_EXPLAIN_RATE = env.float("API_SLOW_QUERY_EXPLAIN_RATE", default=0.1)
+API_SLOW_QUERY_REPEAT_INTERVAL = env.int("API_SLOW_QUERY_REPEAT_INTERVAL", default=60)
+# Also store the query parameters; they can hold personal data, so only for debugging.
+# Slow queries in a transaction that is rolled back are only in the log, not stored.
+API_SLOW_QUERY_STORE_PARAMS = env.bool("API_SLOW_QUERY_STORE_PARAMS", default=False)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -239,11 +369,18 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',  # or TokenAutentication
         'api.authentication.BearerAuthentication',
+        'api.authentication.SignedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
     ],
+    # orjson-backed JSON by default; columnar JSON and MessagePack on request (Accept header or ?format=)
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.ColumnarJSONRenderer',
+    ] + (['api.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 12,  # You can adjust this as needed
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
@@ -251,3 +388,19 @@ REST_FRAMEWORK = {
 
 AUTH_USER_MODEL = 'api.CustomUser'
 
+
+# Identity checker: serve status/ counts from the cache (invalidated on upload/delete)
+IDENTITY_CHECKER_CACHE_STATUS = env.bool("IDENTITY_CHECKER_CACHE_STATUS", default=False)
+
+# Seconds a verified Bearer token is trusted without re-hashing the password
+BEARER_AUTH_CACHE_TIMEOUT = env.int("BEARER_AUTH_CACHE_TIMEOUT", default=300)
+
+# Lifetime in seconds of the signed access tokens issued by /api/token/
+ACCESS_TOKEN_MAX_AGE = env.int("ACCESS_TOKEN_MAX_AGE", default=15 * 60)
+
+# Seconds the user behind access tokens is cached. Saving the user clears the entry in
+# the shared "file" cache at once; with "locmem" other workers see it after this long
+ACCESS_TOKEN_USER_CACHE_TIMEOUT = env.int("ACCESS_TOKEN_USER_CACHE_TIMEOUT", default=60)
+
+# Largest file in bytes that chunked-upload/ accepts (total_size of a new upload)
+CHUNKED_UPLOAD_MAX_SIZE = env.int("CHUNKED_UPLOAD_MAX_SIZE", default=2 * 1024 ** 3)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Identity, UploadLog
+from .cache import bump_generation
+from .models import Identity, IdentitySnapshot, UploadLog
 
 
 @admin.register(Identity)
@@ -8,19 +9,52 @@ class IdentityAdmin(admin.ModelAdmin):
     list_filter = ("application", "source")
     search_fields = ("username", "email", "display_name", "department")
     ordering = ("application", "source", "username")
-    readonly_fields = ("uploaded_at", "extra_data")
+    readonly_fields = ("uploaded_at", "extra_data", "content_hash")
 
     def get_queryset(self, request):
         return super().get_queryset(request).order_by("application", "source", "username")
 
+    # Edits here bypass the upload views: invalidate the cached results (and ETags) ourselves.
+    # Not done with post_delete signals, those would make the bulk deletes of uploads row by row.
+    def save_model(self, request, obj, form, change):
+        if change and "application" in form.changed_data:
+            bump_generation(form.initial["application"])
+        super().save_model(request, obj, form, change)
+        bump_generation(obj.application)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_generation(obj.application)
+
+    def delete_queryset(self, request, queryset):
+        applications = set(queryset.values_list("application", flat=True))
+        super().delete_queryset(request, queryset)
+        for application in applications:
+            bump_generation(application)
+
 
 @admin.register(UploadLog)
 class UploadLogAdmin(admin.ModelAdmin):
-    list_display = ("filename", "application", "source", "row_count", "status", "uploaded_at")
-    list_filter = ("application", "source", "status")
+    list_display = ("filename", "application", "source", "mode", "row_count", "status", "uploaded_at")
+    list_filter = ("application", "source", "mode", "status")
     search_fields = ("filename",)
-    readonly_fields = ("application", "source", "filename", "row_count", "uploaded_at", "status", "error_message")
+    readonly_fields = (
+        "application", "source", "filename", "row_count", "mode",
+        "added_count", "removed_count", "changed_count", "uploaded_at", "status", "error_message",
+    )
     ordering = ("-uploaded_at",)
 
     def has_add_permission(self, request):
         return False
+
+
+@admin.register(IdentitySnapshot)
+class IdentitySnapshotAdmin(admin.ModelAdmin):
+    list_display = ("application", "source", "size", "upload_log", "created_at")
+    list_filter = ("application", "source")
+    exclude = ("usernames", "hashes")
+    readonly_fields = ("application", "source", "upload_log", "size", "created_at")
+    ordering = ("-created_at",)
+
+    def has_add_permission(self, request):
+        return False
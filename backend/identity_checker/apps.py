@@ -1,7 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class IdentityCheckerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "identity_checker"
     verbose_name = "Identity Checker"
+
+    def ready(self):
+        from .cross_reference import register_sqlite_lower
+        connection_created.connect(register_sqlite_lower, dispatch_uid="identity_checker.cross_reference.register_sqlite_lower")
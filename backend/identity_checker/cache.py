@@ -0,0 +1,82 @@
+"""
+Caching of computed identity results per application.
+
+Every write to an application's identities bumps its generation counter.
+Cached results are keyed on (application, generation), so stale entries
+are never served and simply expire from the cache.
+"""
+
+import json
+from typing import Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from api.timing import timer
+
+from .cross_reference import cross_reference
+from .models import Application, DataGeneration, Identity, IdentitySource
+
+CACHE_TIMEOUT = getattr(settings, "IDENTITY_CHECKER_CACHE_TIMEOUT", 60 * 60)
+
+
+def get_generation(application: str) -> int:
+    generation = (
+        DataGeneration.objects.filter(application=application)
+        .values_list("generation", flat=True)
+        .first()
+    )
+    return generation or 0
+
+
+def get_generations() -> Dict[str, int]:
+    return dict(DataGeneration.objects.values_list("application", "generation"))
+
+
+def bump_generation(application: str) -> None:
+    """Invalidate all cached results for an application."""
+    updated = DataGeneration.objects.filter(application=application).update(
+        generation=F("generation") + 1
+    )
+    if not updated:
+        _, created = DataGeneration.objects.get_or_create(
+            application=application, defaults={"generation": 1}
+        )
+        if not created:
+            DataGeneration.objects.filter(application=application).update(
+                generation=F("generation") + 1
+            )
+
+
+def cached_cross_reference(application: str) -> str:
+    """Return the cross-reference result for an application as a JSON string."""
+    key = f"identity_checker:cross_reference:{application}:{get_generation(application)}"
+    body = cache.get(key)
+    if body is None:
+        with timer("cross_reference"):
+            body = json.dumps(cross_reference(application))
+        cache.set(key, body, CACHE_TIMEOUT)
+    return body
+
+
+def identity_counts() -> Dict[str, Dict[str, int]]:
+    """Record counts for every application+source combination, in one query."""
+    result = {app: {src: 0 for src in IdentitySource.values} for app in Application.values}
+    rows = Identity.objects.values("application", "source").annotate(count=Count("id")).order_by()
+    for row in rows:
+        result.setdefault(row["application"], {})[row["source"]] = row["count"]
+    return result
+
+
+def cached_identity_counts() -> Dict[str, Dict[str, int]]:
+    """`identity_counts`, cached until any application's generation changes."""
+    generations = get_generations()
+    key = "identity_checker:status:" + ":".join(
+        f"{app}={generations.get(app, 0)}" for app in Application.values
+    )
+    counts = cache.get(key)
+    if counts is None:
+        counts = identity_counts()
+        cache.set(key, counts, CACHE_TIMEOUT)
+    return counts
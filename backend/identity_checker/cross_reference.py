@@ -3,11 +3,66 @@ Cross-reference logic for the three identity sources of a single application.
 
 Compares by username (case-insensitive).
 Returns sets categorised by which sources contain them.
+
+`cross_reference` loads every identity of the application into Python.
+The database-side helpers below group by lower(username) and build a
+source bitmask with conditional aggregation instead, so the summary is a
+single aggregate query and category members can be fetched page by page.
+Both fold case like str.lower and keep the last row (by username) of
+duplicates that differ only in case.
 """
 
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Iterator, Optional
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Max, QuerySet, Value, When
+from django.db.models.functions import Lower
+
 from .models import Identity, IdentitySource
 
+SOURCE_BITS: Dict[str, int] = {
+    IdentitySource.USERS: 1,
+    IdentitySource.MAIL_DIST_LIST: 2,
+    IdentitySource.AD_GROUP: 4,
+}
+
+# The flag of each source in a cross-reference entry
+ENTRY_FLAGS: Dict[str, str] = {
+    IdentitySource.USERS: "in_users",
+    IdentitySource.MAIL_DIST_LIST: "in_mail_dist",
+    IdentitySource.AD_GROUP: "in_ad_group",
+}
+
+
+class UsernameKey(Lower):
+    """
+    lower(username). SQLite's LOWER only folds ASCII letters, so there it calls
+    Python's str.lower instead (registered by register_sqlite_lower).
+    """
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function="PY_LOWER", **extra_context)
+
+
+def _py_lower(value):
+    return None if value is None else value.lower()
+
+
+def register_sqlite_lower(sender, connection, **kwargs):
+    """connection_created receiver: PY_LOWER for UsernameKey on SQLite connections."""
+    if connection.vendor == "sqlite":
+        connection.connection.create_function("PY_LOWER", 1, _py_lower, deterministic=True)
+
+
+CATEGORY_MASKS: Dict[str, int] = {
+    "in_all": 7,
+    "only_in_users": 1,
+    "only_in_mail_dist": 2,
+    "only_in_ad_group": 4,
+    "in_users_and_mail": 3,
+    "in_users_and_ad": 5,
+    "in_mail_and_ad": 6,
+}
+
 
 def cross_reference(application: str) -> Dict[str, Any]:
     """
@@ -79,6 +134,157 @@ def cross_reference(application: str) -> Dict[str, Any]:
             "mail_dist_list": len(mail) > 0,
             "ad_group": len(ad) > 0,
         },
+        "categories": {name: len(result[name]) for name in CATEGORY_MASKS},
     }
 
     return result
+
+
+def grouped_identities(application: str) -> QuerySet:
+    """
+    One row per lower(username) with a `mask` of the sources it appears in.
+    Backed by the (application, lower(username)) index on Identity.
+    """
+    mask = sum(
+        (
+            Max(Case(When(source=source, then=Value(bit)), default=Value(0), output_field=IntegerField()))
+            for source, bit in SOURCE_BITS.items()
+        ),
+        Value(0),
+    )
+    return (
+        Identity.objects.filter(application=application)
+        .annotate(key=UsernameKey("username"))
+        .values("key")
+        .annotate(mask=mask)
+        .order_by("key")
+    )
+
+
+def category_keys(application: str, category: str) -> QuerySet:
+    """Grouped rows ({key, mask}) belonging to one category, ordered by key."""
+    return grouped_identities(application).filter(mask=CATEGORY_MASKS[category])
+
+
+def cross_reference_summary(application: str) -> Dict[str, Any]:
+    """
+    Same summary as `cross_reference`, computed by a single aggregate query
+    over the grouped identities (no rows are loaded into Python).
+    """
+    sql, params = grouped_identities(application).order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT sub.mask, COUNT(*) FROM ({sql}) sub GROUP BY sub.mask", params)
+        counts = dict(cursor.fetchall())
+
+    def with_bit(bit: int) -> int:
+        return sum(n for mask, n in counts.items() if mask & bit)
+
+    total = sum(counts.values())
+    users_count = with_bit(SOURCE_BITS[IdentitySource.USERS])
+    mail_count = with_bit(SOURCE_BITS[IdentitySource.MAIL_DIST_LIST])
+    ad_count = with_bit(SOURCE_BITS[IdentitySource.AD_GROUP])
+    in_all = counts.get(CATEGORY_MASKS["in_all"], 0)
+
+    return {
+        "total_unique": total,
+        "users_count": users_count,
+        "mail_dist_count": mail_count,
+        "ad_group_count": ad_count,
+        "in_all_count": in_all,
+        "discrepancies": total - in_all,
+        "sources_loaded": {
+            "users": users_count > 0,
+            "mail_dist_list": mail_count > 0,
+            "ad_group": ad_count > 0,
+        },
+        "categories": {name: counts.get(mask, 0) for name, mask in CATEGORY_MASKS.items()},
+    }
+
+
+def category_members(
+    application: str,
+    category: str,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """
+    Members of one category, ordered by lower(username).
+    Pass the last key of the previous page as `after` to paginate.
+    """
+    qs = category_keys(application, category)
+    if after is not None:
+        qs = qs.filter(key__gt=after)
+    if limit is not None:
+        qs = qs[:limit]
+    return entries_for_keys(application, qs)
+
+
+def entries_for_keys(application: str, grouped_rows: Iterable[dict]) -> List[dict]:
+    """
+    Turn grouped rows ({key, mask}) into cross-reference entries. Details are
+    taken from the users source first, then mail, then AD, and within a source
+    from the last username in order, like `cross_reference`.
+    """
+    grouped_rows = list(grouped_rows)
+    if not grouped_rows:
+        return []
+
+    priority = {source: i for i, source in enumerate(SOURCE_BITS)}
+    details: Dict[str, dict] = {}
+    rows = (
+        Identity.objects.filter(application=application)
+        .annotate(key=UsernameKey("username"))
+        .filter(key__in=[r["key"] for r in grouped_rows])
+        .values("key", "source", "username", "email", "display_name", "department")
+        .order_by("username")
+    )
+    for row in rows:
+        current = details.get(row["key"])
+        if current is None or priority[row["source"]] <= priority[current["source"]]:
+            details[row["key"]] = row
+
+    entries = []
+    for r in grouped_rows:
+        row = details.get(r["key"])
+        if row is None:
+            # Deleted since the keys were read (a concurrent replace upload or delete)
+            continue
+        entries.append({
+            "username": row["username"],
+            "email": row["email"],
+            "display_name": row["display_name"],
+            "department": row["department"],
+            **{flag: bool(r["mask"] & SOURCE_BITS[source]) for source, flag in ENTRY_FLAGS.items()},
+        })
+    return entries
+
+
+def iter_members(
+    application: str, category: Optional[str] = None, chunk_size: int = 2000
+) -> Iterator[dict]:
+    """
+    Stream cross-reference entries (all categories, or one) from a server-side
+    cursor, `chunk_size` keys at a time. Each entry carries its category name.
+    """
+    if category is None:
+        qs = grouped_identities(application)
+    else:
+        qs = category_keys(application, category)
+    names = {mask: name for name, mask in CATEGORY_MASKS.items()}
+
+    batch: List[dict] = []
+    for row in qs.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield from _with_category(application, batch, names)
+            batch = []
+    if batch:
+        yield from _with_category(application, batch, names)
+
+
+def _with_category(application: str, batch: List[dict], names: Dict[int, str]) -> Iterator[dict]:
+    # Keys deleted meanwhile have no entry, so the category is derived from the entry itself
+    for entry in entries_for_keys(application, batch):
+        mask = sum(bit for source, bit in SOURCE_BITS.items() if entry[ENTRY_FLAGS[source]])
+        entry["category"] = names[mask]
+        yield entry
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:37
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity_checker', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='identity',
+            index=models.Index(models.F('application'), django.db.models.functions.text.Lower('username'), name='identity_app_lower_username'),
+        ),
+    ]
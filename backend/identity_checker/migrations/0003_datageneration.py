@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity_checker', '0002_identity_lower_username_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('application', models.CharField(choices=[('iprotect', 'iProtect'), ('iwork', 'iWork'), ('ocms', 'OCMS')], max_length=20, unique=True)),
+                ('generation', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity_checker', '0003_datageneration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='identity',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadlog',
+            name='added_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadlog',
+            name='changed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadlog',
+            name='mode',
+            field=models.CharField(choices=[('replace', 'Replace'), ('diff', 'Diff')], default='replace', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='uploadlog',
+            name='removed_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
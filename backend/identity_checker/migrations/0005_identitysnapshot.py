@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity_checker', '0004_identity_content_hash_uploadlog_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentitySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('application', models.CharField(choices=[('iprotect', 'iProtect'), ('iwork', 'iWork'), ('ocms', 'OCMS')], max_length=20)),
+                ('source', models.CharField(choices=[('users', 'Users'), ('mail_dist_list', 'Mail Distribution List'), ('ad_group', 'AD Group')], max_length=20)),
+                ('size', models.IntegerField(default=0)),
+                ('usernames', models.JSONField(blank=True, default=list)),
+                ('hashes', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('upload_log', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='identity_checker.uploadlog')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['application', 'source'], name='identity_ch_applica_e76042_idx')],
+            },
+        ),
+    ]
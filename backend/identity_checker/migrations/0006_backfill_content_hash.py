@@ -0,0 +1,42 @@
+# Rows stored before content hashes existed have content_hash = '', which made
+# the first diff upload report all of them as changed.
+
+import hashlib
+import json
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def content_hash(identity):
+    """Frozen copy of identity_checker.sync.content_hash for a stored row."""
+    payload = json.dumps(
+        [identity.email, identity.display_name, identity.department, identity.extra_data or {}],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def backfill_content_hash(apps, schema_editor):
+    Identity = apps.get_model("identity_checker", "Identity")
+    batch = []
+    for identity in Identity.objects.filter(content_hash="").iterator(chunk_size=BATCH_SIZE):
+        identity.content_hash = content_hash(identity)
+        batch.append(identity)
+        if len(batch) >= BATCH_SIZE:
+            Identity.objects.bulk_update(batch, ["content_hash"])
+            batch = []
+    Identity.objects.bulk_update(batch, ["content_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity_checker', '0005_identitysnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
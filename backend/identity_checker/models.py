@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 
 
 class Application(models.TextChoices):
@@ -21,24 +22,49 @@ class Identity(models.Model):
     display_name = models.CharField(max_length=255, blank=True, null=True)
     department = models.CharField(max_length=255, blank=True, null=True)
     extra_data = models.JSONField(default=dict, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, default="")
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("application", "source", "username")
         indexes = [
             models.Index(fields=["application", "source"]),
+            models.Index("application", Lower("username"), name="identity_app_lower_username"),
         ]
         ordering = ["username"]
 
     def __str__(self):
         return f"{self.application} / {self.source} / {self.username}"
 
+    def save(self, *args, **kwargs):
+        """Keep content_hash in line with the fields (uploads set it themselves via bulk writes)."""
+        from .sync import content_hash
+
+        self.content_hash = content_hash({
+            "email": self.email,
+            "display_name": self.display_name,
+            "department": self.department,
+            "extra_data": self.extra_data,
+        })
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "content_hash"}
+        super().save(*args, **kwargs)
+
 
 class UploadLog(models.Model):
+    MODE_CHOICES = (
+        ("replace", "Replace"),
+        ("diff", "Diff"),
+    )
     application = models.CharField(max_length=20, choices=Application.choices)
     source = models.CharField(max_length=20, choices=IdentitySource.choices)
     filename = models.CharField(max_length=255)
     row_count = models.IntegerField(default=0)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default="replace")
+    added_count = models.IntegerField(default=0)
+    removed_count = models.IntegerField(default=0)
+    changed_count = models.IntegerField(default=0)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, default="success")
     error_message = models.TextField(blank=True, null=True)
@@ -48,3 +74,37 @@ class UploadLog(models.Model):
 
     def __str__(self):
         return f"{self.application}/{self.source} — {self.filename} ({self.uploaded_at:%Y-%m-%d %H:%M})"
+
+
+class DataGeneration(models.Model):
+    """Bumped on every write to an application's identities; used as a cache key."""
+
+    application = models.CharField(max_length=20, choices=Application.choices, unique=True)
+    generation = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.application} @ {self.generation}"
+
+
+class IdentitySnapshot(models.Model):
+    """
+    Sorted usernames and short content hashes of an (application, source)
+    slice right after an upload, so uploads can be compared later.
+    """
+
+    application = models.CharField(max_length=20, choices=Application.choices)
+    source = models.CharField(max_length=20, choices=IdentitySource.choices)
+    upload_log = models.OneToOneField(UploadLog, on_delete=models.CASCADE, related_name="snapshot")
+    size = models.IntegerField(default=0)
+    usernames = models.JSONField(default=list, blank=True)
+    hashes = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["application", "source"]),
+        ]
+
+    def __str__(self):
+        return f"{self.application}/{self.source} — {self.size} identities ({self.created_at:%Y-%m-%d %H:%M})"
@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CrossReferenceCursorPagination(CursorPagination):
+    """Keyset pagination over grouped cross-reference rows (ordered by lower(username))."""
+
+    ordering = "key"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class IdentityCursorPagination(CursorPagination):
+    ordering = "id"
+    page_size = 500
+    page_size_query_param = "page_size"
+    max_page_size = 5000
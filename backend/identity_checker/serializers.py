@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Identity, UploadLog
+from .models import Identity, IdentitySnapshot, UploadLog
 
 
 class IdentitySerializer(serializers.ModelSerializer):
@@ -27,7 +27,27 @@ class UploadLogSerializer(serializers.ModelSerializer):
             "source",
             "filename",
             "row_count",
+            "mode",
+            "added_count",
+            "removed_count",
+            "changed_count",
             "uploaded_at",
             "status",
             "error_message",
         ]
+
+
+class IdentitySnapshotSerializer(serializers.ModelSerializer):
+    filename = serializers.CharField(source="upload_log.filename", read_only=True)
+
+    class Meta:
+        model = IdentitySnapshot
+        fields = [
+            "id",
+            "application",
+            "source",
+            "upload_log",
+            "filename",
+            "size",
+            "created_at",
+        ]
@@ -0,0 +1,56 @@
+"""
+Point-in-time snapshots of identity uploads.
+
+A snapshot stores only the sorted usernames of a slice plus a short
+content hash per username, so two snapshots can be diffed with a single
+linear merge walk.
+"""
+
+from typing import Dict, List
+
+from .models import Identity, IdentitySnapshot, UploadLog
+
+# Characters of Identity.content_hash kept per username
+HASH_LENGTH = 16
+
+
+def create_snapshot(upload_log: UploadLog) -> IdentitySnapshot:
+    """Snapshot the current identities of the upload's application+source."""
+    rows = sorted(
+        Identity.objects.filter(
+            application=upload_log.application, source=upload_log.source
+        ).values_list("username", "content_hash")
+    )
+    return IdentitySnapshot.objects.create(
+        application=upload_log.application,
+        source=upload_log.source,
+        upload_log=upload_log,
+        size=len(rows),
+        usernames=[username for username, _ in rows],
+        hashes=[digest[:HASH_LENGTH] for _, digest in rows],
+    )
+
+
+def diff_snapshots(old: IdentitySnapshot, new: IdentitySnapshot) -> Dict[str, List[str]]:
+    """Usernames added, removed and changed between two snapshots."""
+    added, removed, changed = [], [], []
+    old_names, old_hashes = old.usernames, old.hashes
+    new_names, new_hashes = new.usernames, new.hashes
+    i = j = 0
+
+    while i < len(old_names) and j < len(new_names):
+        if old_names[i] == new_names[j]:
+            if old_hashes[i] != new_hashes[j]:
+                changed.append(new_names[j])
+            i += 1
+            j += 1
+        elif old_names[i] < new_names[j]:
+            removed.append(old_names[i])
+            i += 1
+        else:
+            added.append(new_names[j])
+            j += 1
+
+    removed.extend(old_names[i:])
+    added.extend(new_names[j:])
+    return {"added": added, "removed": removed, "changed": changed}
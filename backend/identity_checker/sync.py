@@ -0,0 +1,116 @@
+"""
+Write parsed upload rows into the Identity table.
+
+`replace_identities` wipes the (application, source) slice and rewrites it.
+`diff_identities` compares the rows against the stored slice by username
+and content hash, and only inserts, updates or deletes what changed.
+
+Both lock the application's DataGeneration row first, so two uploads for
+the same application run one after the other instead of both inserting
+the same new usernames (which would fail on the unique constraint).
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Tuple
+
+from django.db import transaction
+
+from .models import DataGeneration, Identity
+
+BATCH_SIZE = 1000
+
+UPDATE_FIELDS = ["email", "display_name", "department", "extra_data", "content_hash"]
+
+
+def content_hash(row: Dict[str, Any]) -> str:
+    """Hash of everything stored for an identity except its username."""
+    payload = json.dumps(
+        [row.get("email"), row.get("display_name"), row.get("department"), row.get("extra_data") or {}],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _unique_rows(rows: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], int]:
+    """Return ({username: row}, skipped). Rows without a username or with a duplicate one are skipped."""
+    unique: Dict[str, Dict[str, Any]] = {}
+    skipped = 0
+    for row in rows:
+        username = (row.get("username") or "").strip()
+        if not username or username in unique:
+            skipped += 1
+            continue
+        unique[username] = row
+    return unique, skipped
+
+
+def _build(application: str, source: str, username: str, row: Dict[str, Any], pk=None) -> Identity:
+    return Identity(
+        pk=pk,
+        application=application,
+        source=source,
+        username=username,
+        email=row.get("email"),
+        display_name=row.get("display_name"),
+        department=row.get("department"),
+        extra_data=row.get("extra_data") or {},
+        content_hash=content_hash(row),
+    )
+
+
+def _lock_application(application: str) -> None:
+    """Block other writers of the application's identities until the transaction ends."""
+    DataGeneration.objects.get_or_create(application=application)
+    DataGeneration.objects.select_for_update().get(application=application)
+
+
+def replace_identities(application: str, source: str, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    unique, skipped = _unique_rows(rows)
+    with transaction.atomic():
+        _lock_application(application)
+        deleted, _ = Identity.objects.filter(application=application, source=source).delete()
+        Identity.objects.bulk_create(
+            [_build(application, source, username, row) for username, row in unique.items()],
+            batch_size=BATCH_SIZE,
+        )
+    return {"created": len(unique), "updated": 0, "deleted": deleted, "unchanged": 0, "skipped": skipped}
+
+
+def diff_identities(application: str, source: str, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    unique, skipped = _unique_rows(rows)
+
+    with transaction.atomic():
+        _lock_application(application)
+        stored = {
+            username: (pk, digest)
+            for pk, username, digest in Identity.objects.filter(
+                application=application, source=source
+            ).values_list("id", "username", "content_hash")
+        }
+
+        to_create = []
+        to_update = []
+        for username, row in unique.items():
+            if username not in stored:
+                to_create.append(_build(application, source, username, row))
+                continue
+            pk, digest = stored[username]
+            if digest != content_hash(row):
+                to_update.append(_build(application, source, username, row, pk=pk))
+
+        removed_ids = [pk for username, (pk, _) in stored.items() if username not in unique]
+
+        Identity.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        Identity.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=BATCH_SIZE)
+        for i in range(0, len(removed_ids), BATCH_SIZE):
+            Identity.objects.filter(id__in=removed_ids[i:i + BATCH_SIZE]).delete()
+
+    return {
+        "created": len(to_create),
+        "updated": len(to_update),
+        "deleted": len(removed_ids),
+        "unchanged": len(unique) - len(to_create) - len(to_update),
+        "skipped": skipped,
+    }
@@ -0,0 +1,550 @@
+import csv
+import importlib
+import io
+import json
+import random
+from unittest import mock
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmarks import generators
+from api.models import CustomUser
+from api.tests import BudgetTestCase
+
+from .cache import get_generation, identity_counts
+from .cross_reference import (CATEGORY_MASKS, category_members, cross_reference, cross_reference_summary,
+                              entries_for_keys, iter_members)
+from .models import Application, DataGeneration, Identity, IdentitySnapshot, IdentitySource, UploadLog
+from .serializers import IdentitySerializer
+from .snapshots import create_snapshot, diff_snapshots
+from .sync import content_hash, diff_identities, replace_identities
+
+SEED_ROWS = 1000
+
+
+class IdentityCheckerBudgetTests(BudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='user', role='U')
+        rng = random.Random(0)
+        for application in (Application.IPROTECT, Application.IWORK):
+            for source in IdentitySource.values:
+                Identity.objects.bulk_create(
+                    Identity(application=application, source=source, username=username, email=email,
+                             display_name=display_name, department=department)
+                    for username, email, display_name, department in generators.identity_rows(SEED_ROWS, rng, source)
+                )
+                UploadLog.objects.create(application=application, source=source, filename=f'{source}.csv',
+                                         row_count=SEED_ROWS)
+
+    def test_status(self):
+        response = self.assertWithinBudget('api/identity-checker/status/', self.user)
+        self.assertEqual(response.json()[Application.IPROTECT][IdentitySource.USERS], SEED_ROWS)
+
+    def test_identities(self):
+        self.assertWithinBudget('api/identity-checker/identities/', self.user,
+                                application=Application.IPROTECT, source=IdentitySource.USERS)
+
+    def test_cross_reference_summary(self):
+        self.assertWithinBudget('api/identity-checker/cross-reference/', self.user,
+                                application=Application.IPROTECT, view='summary')
+
+    def test_cross_reference_category(self):
+        self.assertWithinBudget('api/identity-checker/cross-reference/', self.user,
+                                application=Application.IPROTECT, category='only_in_users')
+
+    def test_upload_logs(self):
+        self.assertWithinBudget('api/identity-checker/upload-logs/', self.user, application=Application.IPROTECT)
+
+    def test_snapshots(self):
+        self.assertWithinBudget('api/identity-checker/snapshots/', self.user,
+                                application=Application.IPROTECT, source=IdentitySource.USERS)
+
+
+class IdentityAdminTests(TestCase):
+    def setUp(self):
+        admin = CustomUser.objects.create_superuser(username='admin', password='pw', role='A')
+        self.client.force_login(admin)
+        row = {'username': 'jan', 'email': 'jan@example.com', 'display_name': 'Jan', 'department': 'ICT'}
+        diff_identities(Application.IPROTECT, IdentitySource.USERS, [row])
+        self.row = row
+        self.identity = Identity.objects.get(username='jan')
+
+    def change(self, **data):
+        fields = {'application': self.identity.application, 'source': self.identity.source,
+                  'username': self.identity.username, 'email': self.identity.email,
+                  'display_name': self.identity.display_name, 'department': self.identity.department}
+        fields.update(data)
+        return self.client.post(f'/admin/identity_checker/identity/{self.identity.pk}/change/', fields)
+
+    def test_edit_bumps_generation_and_content_hash(self):
+        generation = get_generation(Application.IPROTECT)
+        response = self.change(department='HR')
+        self.assertEqual(response.status_code, 302)
+
+        self.identity.refresh_from_db()
+        self.assertEqual(self.identity.department, 'HR')
+        self.assertGreater(get_generation(Application.IPROTECT), generation)
+        self.assertEqual(self.identity.content_hash, content_hash({**self.row, 'department': 'HR'}))
+
+        # The next diff upload sees the edited row as changed and restores it
+        result = diff_identities(Application.IPROTECT, IdentitySource.USERS, [self.row])
+        self.assertEqual(result['updated'], 1)
+
+    def test_moving_to_another_application_bumps_both(self):
+        generations = get_generation(Application.IPROTECT), get_generation(Application.IWORK)
+        self.change(application=Application.IWORK)
+        self.assertGreater(get_generation(Application.IPROTECT), generations[0])
+        self.assertGreater(get_generation(Application.IWORK), generations[1])
+
+    def test_delete_bumps_generation(self):
+        generation = get_generation(Application.IPROTECT)
+        response = self.client.post(f'/admin/identity_checker/identity/{self.identity.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Identity.objects.exists())
+        self.assertGreater(get_generation(Application.IPROTECT), generation)
+
+    def test_bulk_delete_bumps_generation(self):
+        generation = get_generation(Application.IPROTECT)
+        self.client.post('/admin/identity_checker/identity/', {
+            'action': 'delete_selected', '_selected_action': [self.identity.pk], 'post': 'yes',
+        })
+        self.assertFalse(Identity.objects.exists())
+        self.assertGreater(get_generation(Application.IPROTECT), generation)
+
+
+def identity_row(username, department='ICT', **extra):
+    return {'username': username, 'email': f'{username}@example.com', 'display_name': username.title(),
+            'department': department, **extra}
+
+
+class SyncTests(TestCase):
+    application, source = Application.IPROTECT, IdentitySource.USERS
+
+    def stored(self):
+        return dict(Identity.objects.filter(application=self.application, source=self.source)
+                    .values_list('username', 'department'))
+
+    def test_diff_counts(self):
+        diff_identities(self.application, self.source, [identity_row('anna'), identity_row('bert'), identity_row('cor')])
+        ids = dict(Identity.objects.values_list('username', 'id'))
+
+        result = diff_identities(self.application, self.source, [
+            identity_row('anna'),                    # unchanged
+            identity_row('bert', department='HR'),   # updated
+            identity_row('dirk'),                    # created; cor is deleted
+            identity_row('dirk'),                    # duplicate: skipped
+            {'username': ' '},                       # no username: skipped
+        ])
+
+        self.assertEqual(result, {'created': 1, 'updated': 1, 'deleted': 1, 'unchanged': 1, 'skipped': 2})
+        self.assertEqual(self.stored(), {'anna': 'ICT', 'bert': 'HR', 'dirk': 'ICT'})
+        # Updates keep the row (and its id)
+        self.assertEqual(Identity.objects.get(username='bert').id, ids['bert'])
+
+    def test_diff_only_touches_its_slice(self):
+        diff_identities(self.application, IdentitySource.AD_GROUP, [identity_row('anna')])
+        diff_identities(Application.IWORK, self.source, [identity_row('anna')])
+
+        result = diff_identities(self.application, self.source, [identity_row('bert')])
+
+        self.assertEqual(result['deleted'], 0)
+        self.assertEqual(Identity.objects.count(), 3)
+
+    def test_diff_sees_extra_data_changes(self):
+        diff_identities(self.application, self.source, [identity_row('anna', extra_data={'badge': 1})])
+        result = diff_identities(self.application, self.source, [identity_row('anna', extra_data={'badge': 2})])
+        self.assertEqual(result['updated'], 1)
+
+    def test_replace_counts(self):
+        replace_identities(self.application, self.source, [identity_row('anna'), identity_row('bert')])
+        result = replace_identities(self.application, self.source, [identity_row('cor'), identity_row('cor')])
+
+        self.assertEqual(result, {'created': 1, 'updated': 0, 'deleted': 2, 'unchanged': 0, 'skipped': 1})
+        self.assertEqual(self.stored(), {'cor': 'ICT'})
+
+    def test_replace_and_diff_store_the_same_hash(self):
+        replace_identities(self.application, self.source, [identity_row('anna')])
+        result = diff_identities(self.application, self.source, [identity_row('anna')])
+        self.assertEqual(result['unchanged'], 1)
+
+
+class SnapshotTests(TestCase):
+    application, source = Application.IPROTECT, IdentitySource.USERS
+
+    def upload(self, rows):
+        diff_identities(self.application, self.source, rows)
+        log = UploadLog.objects.create(application=self.application, source=self.source, filename='users.csv',
+                                       row_count=len(rows), mode='diff')
+        return create_snapshot(log)
+
+    def test_create_snapshot_is_sorted(self):
+        snapshot = self.upload([identity_row('cor'), identity_row('anna'), identity_row('bert')])
+        self.assertEqual(snapshot.usernames, ['anna', 'bert', 'cor'])
+        self.assertEqual(snapshot.size, 3)
+        self.assertEqual(len(snapshot.hashes), 3)
+
+    def test_diff_snapshots(self):
+        old = self.upload([identity_row('anna'), identity_row('bert'), identity_row('cor'), identity_row('eva')])
+        new = self.upload([identity_row('anna'), identity_row('bert', department='HR'), identity_row('dirk'),
+                           identity_row('frits')])
+
+        self.assertEqual(diff_snapshots(old, new), {
+            'added': ['dirk', 'frits'], 'removed': ['cor', 'eva'], 'changed': ['bert'],
+        })
+        self.assertEqual(diff_snapshots(new, old), {
+            'added': ['cor', 'eva'], 'removed': ['dirk', 'frits'], 'changed': ['bert'],
+        })
+
+    def test_diff_snapshots_empty(self):
+        empty = self.upload([])
+        full = self.upload([identity_row('anna')])
+        self.assertEqual(diff_snapshots(empty, full), {'added': ['anna'], 'removed': [], 'changed': []})
+        self.assertEqual(diff_snapshots(full, full), {'added': [], 'removed': [], 'changed': []})
+
+    def test_diff_view(self):
+        old = self.upload([identity_row('anna')])
+        new = self.upload([identity_row('bert')])
+        other = IdentitySnapshot.objects.create(
+            application=Application.IWORK, source=self.source, size=0,
+            upload_log=UploadLog.objects.create(application=Application.IWORK, source=self.source, filename='x.csv'),
+        )
+        self.client.force_login(CustomUser.objects.create(username='user', role='U'))
+        url = '/api/identity-checker/snapshots/diff/'
+
+        response = self.client.get(url, {'from': old.pk, 'to': new.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['added'], response.json()['removed']), (['bert'], ['anna']))
+
+        self.assertEqual(self.client.get(url, {'from': old.pk, 'to': other.pk}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': old.pk, 'to': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': old.pk, 'to': 0}).status_code, 400)
+
+
+class SyncLockingTests(TestCase):
+    def test_uploads_lock_the_application(self):
+        for sync in (diff_identities, replace_identities):
+            with self.subTest(sync=sync.__name__), \
+                    mock.patch('django.db.models.QuerySet.select_for_update', autospec=True,
+                               side_effect=lambda qs, *args, **kwargs: qs) as lock:
+                sync(Application.IPROTECT, IdentitySource.USERS, [identity_row('anna')])
+            self.assertEqual(lock.call_args.args[0].model, DataGeneration)
+            self.assertTrue(DataGeneration.objects.filter(application=Application.IPROTECT).exists())
+
+
+class BackfillContentHashTests(TestCase):
+    def test_legacy_rows_get_the_upload_hash(self):
+        row = identity_row('anna', extra_data={'badge': 1})
+        diff_identities(Application.IPROTECT, IdentitySource.USERS, [row])
+        Identity.objects.update(content_hash='')
+
+        backfill = importlib.import_module('identity_checker.migrations.0006_backfill_content_hash')
+        backfill.backfill_content_hash(apps, None)
+
+        self.assertEqual(Identity.objects.get().content_hash, content_hash(row))
+        self.assertEqual(diff_identities(Application.IPROTECT, IdentitySource.USERS, [row])['unchanged'], 1)
+
+
+class IdentityListTests(TestCase):
+    url = '/api/identity-checker/identities/'
+
+    def setUp(self):
+        self.client.force_login(CustomUser.objects.create(username='user', role='U'))
+        diff_identities(Application.IPROTECT, IdentitySource.USERS, [
+            identity_row(name, extra_data={'phone': f'06-{i}'}) for i, name in enumerate(('anna', 'bert', 'cor', 'daan', 'eva'))
+        ])
+        diff_identities(Application.IWORK, IdentitySource.USERS, [identity_row('frank')])
+
+    def get_all(self, **params):
+        """Every row of the listing, following the cursor; page_size=2."""
+        rows, page = [], self.client.get(self.url, {'page_size': 2, **params}).json()
+        while True:
+            self.assertLessEqual(len(page['results']), 2)
+            rows.extend(page['results'])
+            if not page['next']:
+                return rows
+            page = self.client.get(page['next']).json()
+
+    def serialized(self, qs):
+        """What the ModelSerializer view returned for the rows, as JSON."""
+        return json.loads(JSONRenderer().render(IdentitySerializer(qs.order_by('id'), many=True).data))
+
+    def test_pages_match_model_serializer_without_extra_data(self):
+        rows = self.get_all(application=Application.IPROTECT)
+        expected = self.serialized(Identity.objects.filter(application=Application.IPROTECT))
+        for row in expected:
+            del row['extra_data']
+        self.assertEqual(rows, expected)
+
+    def test_fields_projection(self):
+        rows = self.get_all(source=IdentitySource.USERS, fields='username,extra_data')
+        expected = [{key: row[key] for key in ('id', 'username', 'extra_data')}
+                    for row in self.serialized(Identity.objects.all())]
+        self.assertEqual(rows, expected)
+        self.assertEqual(rows[0]['extra_data'], {'phone': '06-0'})
+
+    def test_unknown_field(self):
+        response = self.client.get(self.url, {'fields': 'username,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+
+class StatusTests(TestCase):
+    url = '/api/identity-checker/status/'
+
+    def setUp(self):
+        # Keys only hold the generations, which restart with every test
+        self.addCleanup(cache.clear)
+        cache.clear()
+        self.client.force_login(CustomUser.objects.create(username='user', role='U'))
+        diff_identities(Application.IPROTECT, IdentitySource.USERS, [identity_row(name) for name in ('anna', 'bert')])
+        diff_identities(Application.OCMS, IdentitySource.AD_GROUP, [identity_row('cor')])
+
+    def expected(self):
+        """The counts as StatusView used to compute them: one COUNT per application and source."""
+        return {
+            application: {
+                source: Identity.objects.filter(application=application, source=source).count()
+                for source in IdentitySource.values
+            }
+            for application in Application.values
+        }
+
+    def test_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = identity_counts()
+        self.assertEqual(counts, self.expected())
+        self.assertEqual(self.client.get(self.url).json(), self.expected())
+
+    @override_settings(IDENTITY_CHECKER_CACHE_STATUS=True)
+    def test_cached_counts_follow_uploads_and_deletes(self):
+        self.assertEqual(self.client.get(self.url).json(), self.expected())
+
+        upload = SimpleUploadedFile('users.csv', b'username\nanna\nbert\ndirk\n', content_type='text/csv')
+        response = self.client.post('/api/identity-checker/upload/', {
+            'application': Application.IPROTECT, 'source': IdentitySource.USERS, 'file': upload,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.get(self.url).json()[Application.IPROTECT][IdentitySource.USERS], 3)
+
+        self.client.delete(f'/api/identity-checker/identities/?application={Application.OCMS}&source=ad_group')
+        self.assertEqual(self.client.get(self.url).json(), self.expected())
+        self.assertEqual(self.expected()[Application.OCMS][IdentitySource.AD_GROUP], 0)
+
+
+class CrossReferenceTests(TestCase):
+    """The database-side helpers against the legacy in-Python `cross_reference` on the same data."""
+    application = Application.IPROTECT
+
+    def add(self, source, *usernames):
+        for username in usernames:
+            Identity.objects.create(application=self.application, source=source, username=username,
+                                    email=f'{username}@{source}.example', department=source)
+
+    def assertSameAsLegacy(self):
+        legacy = cross_reference(self.application)
+        self.assertEqual(cross_reference_summary(self.application), legacy['summary'])
+
+        for category in CATEGORY_MASKS:
+            with self.subTest(category=category):
+                self.assertEqual(category_members(self.application, category), legacy[category])
+                # One member per page, continuing after the last key
+                pages, after = [], None
+                while page := category_members(self.application, category, after=after, limit=1):
+                    pages.extend(page)
+                    after = page[-1]['username'].lower()
+                self.assertEqual(pages, legacy[category])
+
+        expected = sorted(
+            ({**entry, 'category': category} for category in CATEGORY_MASKS for entry in legacy[category]),
+            key=lambda entry: entry['username'].lower(),
+        )
+        self.assertEqual(list(iter_members(self.application, chunk_size=2)), expected)
+        return legacy
+
+    def test_mixed_case_duplicates(self):
+        self.add(IdentitySource.USERS, 'Jan', 'JAN', 'piet')
+        self.add(IdentitySource.MAIL_DIST_LIST, 'jan', 'Piet')
+        self.add(IdentitySource.AD_GROUP, 'JAN', 'klaas')
+
+        legacy = self.assertSameAsLegacy()
+        self.assertEqual([entry['username'] for entry in legacy['in_all']], ['Jan'])
+        self.assertEqual(legacy['summary']['users_count'], 2)
+
+    def test_one_source_empty(self):
+        self.add(IdentitySource.USERS, 'anna', 'bert')
+        self.add(IdentitySource.AD_GROUP, 'Bert', 'cor')
+
+        legacy = self.assertSameAsLegacy()
+        self.assertFalse(legacy['summary']['sources_loaded']['mail_dist_list'])
+
+    def test_non_ascii_usernames(self):
+        self.add(IdentitySource.USERS, 'Élodie', 'Ødegaard', 'zoë')
+        self.add(IdentitySource.MAIL_DIST_LIST, 'élodie', 'ØDEGAARD')
+        self.add(IdentitySource.AD_GROUP, 'ÉLODIE', 'Zoë')
+
+        legacy = self.assertSameAsLegacy()
+        self.assertEqual(legacy['summary']['total_unique'], 3)
+
+    def test_no_identities(self):
+        self.assertSameAsLegacy()
+
+
+class CrossReferenceViewTests(TestCase):
+    application = Application.IPROTECT
+    url = '/api/identity-checker/cross-reference/'
+
+    def setUp(self):
+        self.client.force_login(CustomUser.objects.create(username='user', role='U'))
+        diff_identities(self.application, IdentitySource.USERS,
+                        [identity_row(name) for name in ('anna', 'Bert', 'cor', 'Daan', 'eva', 'jan')])
+        diff_identities(self.application, IdentitySource.AD_GROUP, [identity_row(name) for name in ('bert', 'JAN')])
+
+    def get(self, **params):
+        response = self.client.get(self.url, {'application': self.application, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_summary_only(self):
+        self.assertEqual(self.get(view='summary'), {'summary': cross_reference(self.application)['summary']})
+
+    def test_category_pages(self):
+        legacy = cross_reference(self.application)
+        for category in ('only_in_users', 'in_users_and_ad'):
+            with self.subTest(category=category):
+                members, page = [], self.get(category=category, page_size=2)
+                while True:
+                    self.assertLessEqual(len(page['results']), 2)
+                    members.extend(page['results'])
+                    if not page['next']:
+                        break
+                    page = self.client.get(page['next']).json()
+                self.assertEqual(members, legacy[category])
+
+    def test_category_search_ignores_case(self):
+        page = self.get(category='only_in_users', search='DA')
+        self.assertEqual([entry['username'] for entry in page['results']], ['Daan'])
+
+    def test_full_result_without_parameters(self):
+        self.assertEqual(self.get(), cross_reference(self.application))
+
+    def test_invalid_category(self):
+        response = self.client.get(self.url, {'application': self.application, 'category': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTests(TestCase):
+    application = Application.IPROTECT
+
+    def setUp(self):
+        self.client.force_login(CustomUser.objects.create(username='user', role='U'))
+
+    def test_identity_deleted_during_the_export_is_skipped(self):
+        diff_identities(self.application, IdentitySource.USERS, [identity_row(name) for name in ('anna', 'bert', 'cor')])
+        members = iter_members(self.application, chunk_size=1)
+
+        self.assertEqual(next(members)['username'], 'anna')
+        # Deleted between two chunks, after the cursor read its key
+        Identity.objects.filter(username='bert').delete()
+        rest = list(members)
+        self.assertEqual([(entry['username'], entry['category']) for entry in rest], [('cor', 'only_in_users')])
+
+    def test_entries_for_missing_keys_are_skipped(self):
+        diff_identities(self.application, IdentitySource.USERS, [identity_row('anna')])
+        entries = entries_for_keys(self.application, [{'key': 'anna', 'mask': 1}, {'key': 'gone', 'mask': 3}])
+        self.assertEqual([entry['username'] for entry in entries], ['anna'])
+
+    def export(self, url, **params):
+        response = self.client.get(url, {'application': self.application, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_identity_export_ndjson(self):
+        diff_identities(self.application, IdentitySource.USERS,
+                        [identity_row('anna', extra_data={'phone': '06-1'}), identity_row('bert')])
+        response = self.export('/api/identity-checker/identities/export/ndjson/', fields='username,extra_data')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="identities_{self.application}.ndjson"')
+        self.assertEqual([json.loads(line) for line in self.content(response).splitlines()], [
+            {'username': 'anna', 'extra_data': {'phone': '06-1'}},
+            {'username': 'bert', 'extra_data': {}},
+        ])
+
+    def test_identity_export_csv(self):
+        diff_identities(self.application, IdentitySource.USERS, [identity_row('anna', extra_data={'phone': '06-1'})])
+        response = self.export('/api/identity-checker/identities/export/csv/', fields='username,email,extra_data')
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual(rows, [['username', 'email', 'extra_data'], ['anna', 'anna@example.com', '{"phone": "06-1"}']])
+
+    def test_cross_reference_export_matches_legacy(self):
+        diff_identities(self.application, IdentitySource.USERS, [identity_row(name) for name in ('anna', 'Bert', 'cor')])
+        diff_identities(self.application, IdentitySource.AD_GROUP, [identity_row(name) for name in ('bert', 'dirk')])
+        legacy = cross_reference(self.application)
+
+        response = self.export('/api/identity-checker/cross-reference/export/ndjson/')
+        expected = sorted(({**entry, 'category': category} for category in CATEGORY_MASKS for entry in legacy[category]),
+                          key=lambda entry: entry['username'].lower())
+        self.assertEqual([json.loads(line) for line in self.content(response).splitlines()], expected)
+
+        response = self.export('/api/identity-checker/cross-reference/export/ndjson/', category='only_in_ad_group')
+        self.assertEqual([json.loads(line)['username'] for line in self.content(response).splitlines()], ['dirk'])
+
+    def test_rows_are_read_while_streaming(self):
+        diff_identities(self.application, IdentitySource.USERS, [identity_row('anna')])
+        response = self.export('/api/identity-checker/identities/export/ndjson/', fields='username')
+        # Nothing has been read yet, so a row added now is still exported
+        diff_identities(self.application, IdentitySource.USERS, [identity_row('anna'), identity_row('bert')])
+        self.assertEqual(self.content(response), '{"username": "anna"}\n{"username": "bert"}\n')
+
+    def test_invalid_format(self):
+        response = self.client.get('/api/identity-checker/identities/export/xml/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_csv_cells_cannot_start_formulas(self):
+        diff_identities(self.application, IdentitySource.USERS, [
+            identity_row('anna', department='=HYPERLINK("http://evil","x")'),
+            identity_row('bert', department='@SUM(A1)'),
+            identity_row('cor', department='-1+1'),
+            identity_row('dirk', department='+31'),
+        ])
+        response = self.client.get('/api/identity-checker/cross-reference/export/csv/',
+                                   {'application': self.application})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['department'] for row in rows],
+                         ['\'=HYPERLINK("http://evil","x")', "'@SUM(A1)", "'-1+1", "'+31"])
+
+
+class PermissionTests(TestCase):
+    """Every identity_checker endpoint needs a logged in user (not the model-permission default)."""
+    requests = [
+        ('get', '/api/identity-checker/identities/', {'application': Application.IPROTECT}),
+        ('delete', f'/api/identity-checker/identities/?application={Application.IPROTECT}&source=users', {}),
+        ('get', '/api/identity-checker/identities/export/csv/', {}),
+        ('post', '/api/identity-checker/upload/', {}),
+        ('get', '/api/identity-checker/cross-reference/', {'application': Application.IPROTECT, 'view': 'summary'}),
+        ('get', '/api/identity-checker/cross-reference/export/csv/', {'application': Application.IPROTECT}),
+        ('get', '/api/identity-checker/upload-logs/', {'application': Application.IPROTECT}),
+        ('get', '/api/identity-checker/snapshots/', {'application': Application.IPROTECT, 'source': 'users'}),
+        ('get', '/api/identity-checker/snapshots/diff/', {}),
+        ('get', '/api/identity-checker/status/', {}),
+    ]
+
+    def test_anonymous_is_refused(self):
+        for method, url, data in self.requests:
+            with self.subTest(method=method, url=url):
+                self.assertEqual(getattr(self.client, method)(url, data).status_code, 403)
+
+    def test_user_without_model_permissions_is_served(self):
+        self.client.force_login(CustomUser.objects.create(username='user', role='U'))
+        for method, url, data in self.requests:
+            with self.subTest(method=method, url=url):
+                # 400 for the requests without the required parameters
+                self.assertIn(getattr(self.client, method)(url, data).status_code, (200, 204, 400))
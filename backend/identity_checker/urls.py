@@ -5,8 +5,13 @@ app_name = "identity_checker"
 
 urlpatterns = [
     path("identities/", views.IdentityListView.as_view(), name="identity-list"),
+    path("identities/export/<str:export_format>/", views.IdentityExportView.as_view(), name="identity-export"),
     path("upload/", views.UploadView.as_view(), name="upload"),
+    path("upload-async/", views.upload_async, name="upload-async"),
     path("cross-reference/", views.CrossReferenceView.as_view(), name="cross-reference"),
+    path("cross-reference/export/<str:export_format>/", views.CrossReferenceExportView.as_view(), name="cross-reference-export"),
     path("upload-logs/", views.UploadLogView.as_view(), name="upload-logs"),
+    path("snapshots/", views.SnapshotListView.as_view(), name="snapshot-list"),
+    path("snapshots/diff/", views.SnapshotDiffView.as_view(), name="snapshot-diff"),
     path("status/", views.StatusView.as_view(), name="status"),
 ]
@@ -1,32 +1,76 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import IntegrityError
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_POST
+
+from api.authentication import async_authentication
+from api.conditional import make_etag, not_modified, set_etag
+from api.metrics import registry
+from api.timing import timer
 
-from .models import Identity, UploadLog, Application, IdentitySource
-from .serializers import IdentitySerializer, UploadLogSerializer
+from .models import Identity, IdentitySnapshot, UploadLog, Application, IdentitySource
+from .serializers import IdentitySerializer, IdentitySnapshotSerializer, UploadLogSerializer
 from .parsers import parse_file
-from .cross_reference import cross_reference
+from .cache import (
+    bump_generation, cached_cross_reference, cached_identity_counts, get_generation, get_generations, identity_counts,
+)
+from .cross_reference import (
+    CATEGORY_MASKS, category_keys, cross_reference_summary, entries_for_keys, iter_members,
+)
+from .export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_response
+from .snapshots import create_snapshot, diff_snapshots
+from .sync import diff_identities, replace_identities
+from .pagination import CrossReferenceCursorPagination, IdentityCursorPagination
+
+# extra_data can be large, so it is only returned when asked for via ?fields=
+DEFAULT_IDENTITY_FIELDS = [f for f in IdentitySerializer.Meta.fields if f != "extra_data"]
+
+
+def _identity_fields(param):
+    """Parse a ?fields= value into (fields, unknown field names)."""
+    if not param:
+        return DEFAULT_IDENTITY_FIELDS, []
+    fields = [f.strip() for f in param.split(",") if f.strip()]
+    return fields, sorted(set(fields) - set(IdentitySerializer.Meta.fields))
 
 
 class IdentityListView(APIView):
     """
-    GET /api/identity-checker/identities/?application=iprotect&source=users
+    GET /api/identity-checker/identities/?application=iprotect&source=users&fields=username,extra_data
     DELETE /api/identity-checker/identities/?application=iprotect&source=users
     """
+    permission_classes = [IsAuthenticated]
 
     def get(self, request):
         application = request.query_params.get("application")
         source = request.query_params.get("source")
 
+        fields, unknown = _identity_fields(request.query_params.get("fields"))
+        if unknown:
+            return Response(
+                {"error": f"Unknown fields: {unknown}. Choose from: {IdentitySerializer.Meta.fields}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if "id" not in fields:
+            fields = ["id"] + fields  # needed for the cursor
+
         qs = Identity.objects.all()
         if application:
             qs = qs.filter(application=application)
         if source:
             qs = qs.filter(source=source)
 
-        serializer = IdentitySerializer(qs, many=True)
-        return Response(serializer.data)
+        # values() rows are already JSON-ready, no need for ModelSerializer instances
+        paginator = IdentityCursorPagination()
+        page = paginator.paginate_queryset(qs.values(*fields), request, view=self)
+        return paginator.get_paginated_response(page)
 
     def delete(self, request):
         application = request.query_params.get("application")
@@ -41,132 +85,283 @@ class IdentityListView(APIView):
         deleted_count, _ = Identity.objects.filter(
             application=application, source=source
         ).delete()
+        bump_generation(application)
 
         return Response({"deleted": deleted_count})
 
 
-class UploadView(APIView):
+class IdentityExportView(APIView):
     """
-    POST /api/identity-checker/upload/
-    Form data: application, source, file
-    Replaces all existing identities for that application+source.
+    GET /api/identity-checker/identities/export/csv/?application=iprotect&source=users
+    GET /api/identity-checker/identities/export/ndjson/?application=iprotect&fields=username,extra_data
     """
+    permission_classes = [IsAuthenticated]
 
-    def post(self, request):
-        application = request.data.get("application")
-        source = request.data.get("source")
-        file = request.FILES.get("file")
-
-        # Validate
-        if not application or application not in Application.values:
-            return Response(
-                {"error": f"Invalid application. Choose from: {Application.values}"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        if not source or source not in IdentitySource.values:
-            return Response(
-                {"error": f"Invalid source. Choose from: {IdentitySource.values}"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        if not file:
+    def get(self, request, export_format):
+        if export_format not in EXPORT_FORMATS:
             return Response(
-                {"error": "No file provided"},
+                {"error": f"Invalid format. Choose from: {list(EXPORT_FORMATS)}"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        filename = file.name
-        if not (filename.endswith(".csv") or filename.endswith(".xlsx") or filename.endswith(".xls")):
+        application = request.query_params.get("application")
+        source = request.query_params.get("source")
+
+        fields, unknown = _identity_fields(request.query_params.get("fields"))
+        if unknown:
             return Response(
-                {"error": "Only .csv and .xlsx files are supported"},
+                {"error": f"Unknown fields: {unknown}. Choose from: {IdentitySerializer.Meta.fields}"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        qs = Identity.objects.order_by("application", "source", "username")
+        if application:
+            qs = qs.filter(application=application)
+        if source:
+            qs = qs.filter(source=source)
+
+        rows = qs.values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        filename = "_".join(["identities"] + [p for p in (application, source) if p])
+        return export_response(rows, fields, export_format, filename)
+
+
+def _validate_upload(application, source, mode, file):
+    """Return an error message for invalid upload form data, or None."""
+    if not application or application not in Application.values:
+        return f"Invalid application. Choose from: {Application.values}"
+    if not source or source not in IdentitySource.values:
+        return f"Invalid source. Choose from: {IdentitySource.values}"
+    if mode not in dict(UploadLog.MODE_CHOICES):
+        return f"Invalid mode. Choose from: {list(dict(UploadLog.MODE_CHOICES))}"
+    if not file:
+        return "No file provided"
+    filename = file.name
+    if not (filename.endswith(".csv") or filename.endswith(".xlsx") or filename.endswith(".xls")):
+        return "Only .csv and .xlsx files are supported"
+    return None
+
+
+def _validate_rows(rows):
+    """Return an error message when parsed rows cannot be imported, or None."""
+    if not rows:
+        return "File is empty or has no data rows"
+    # Check we have at least a username column
+    if not any(r.get("username") for r in rows):
+        return "Could not find a username/user/login column in the file"
+    return None
+
+
+def _log_parse_error(application, source, filename, error):
+    UploadLog.objects.create(
+        application=application,
+        source=source,
+        filename=filename,
+        row_count=0,
+        status="error",
+        error_message=str(error),
+    )
+
+
+IDENTITY_UPLOADS = registry.counter(
+    "identity_checker_uploads_total", "Identity files imported", ["application", "source", "mode"],
+)
+IDENTITY_ROWS = registry.counter(
+    "identity_checker_rows_imported_total", "Identity rows per upload result", ["application", "source", "result"],
+)
+
+
+def _store_upload(application, source, mode, filename, rows):
+    """Write parsed rows, log the upload and snapshot the result. Returns the response body."""
+    if mode == "diff":
+        counts = diff_identities(application, source, rows)
+    else:
+        counts = replace_identities(application, source, rows)
+    if counts["created"] or counts["updated"] or counts["deleted"]:
+        bump_generation(application)
+
+    upload_log = UploadLog.objects.create(
+        application=application,
+        source=source,
+        filename=filename,
+        row_count=counts["created"] + counts["updated"] + counts["unchanged"],
+        mode=mode,
+        added_count=counts["created"],
+        removed_count=counts["deleted"],
+        changed_count=counts["updated"],
+        status="success",
+    )
+    create_snapshot(upload_log)
+
+    IDENTITY_UPLOADS.inc(application=application, source=source, mode=mode)
+    for result in ("created", "updated", "deleted", "unchanged"):
+        IDENTITY_ROWS.inc(counts[result], application=application, source=source, result=result)
+
+    return {
+        "application": application,
+        "source": source,
+        "filename": filename,
+        "mode": mode,
+        **counts,
+    }
+
+
+class UploadView(APIView):
+    """
+    POST /api/identity-checker/upload/
+    Form data: application, source, file, mode (optional)
+    mode=replace (default) replaces all existing identities for that application+source.
+    mode=diff only inserts new, updates changed and deletes removed identities.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        application = request.data.get("application")
+        source = request.data.get("source")
+        mode = request.data.get("mode") or "replace"
+        file = request.FILES.get("file")
+
+        error = _validate_upload(application, source, mode, file)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            rows = parse_file(file, filename)
+            with timer("parse"):
+                rows = parse_file(file, file.name)
         except Exception as e:
-            UploadLog.objects.create(
-                application=application,
-                source=source,
-                filename=filename,
-                row_count=0,
-                status="error",
-                error_message=str(e),
-            )
+            _log_parse_error(application, source, file.name, e)
             return Response({"error": f"Parse error: {e}"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not rows:
-            return Response({"error": "File is empty or has no data rows"}, status=status.HTTP_400_BAD_REQUEST)
+        error = _validate_rows(rows)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = _store_upload(application, source, mode, file.name, rows)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
+@require_POST
+@async_authentication
+async def upload_async(request):
+    """
+    POST /api/identity-checker/upload-async/
+    Async (ASGI) variant of UploadView: file parsing runs in a thread pool and the
+    database writes run in one sync_to_async call (they need a transaction).
+    """
+    files = await sync_to_async(lambda: request.FILES)()
+    application = request.POST.get("application")
+    source = request.POST.get("source")
+    mode = request.POST.get("mode") or "replace"
+    file = files.get("file")
+
+    error = _validate_upload(application, source, mode, file)
+    if error:
+        return JsonResponse({"error": error}, status=400)
+
+    try:
+        with timer("parse"):
+            rows = await asyncio.get_running_loop().run_in_executor(None, parse_file, file, file.name)
+    except Exception as e:
+        await sync_to_async(_log_parse_error)(application, source, file.name, e)
+        return JsonResponse({"error": f"Parse error: {e}"}, status=400)
+
+    error = _validate_rows(rows)
+    if error:
+        return JsonResponse({"error": error}, status=400)
+
+    result = await sync_to_async(_store_upload)(application, source, mode, file.name, rows)
+    return JsonResponse(result, status=201)
 
-        # Check we have at least a username column
-        if not any(r.get("username") for r in rows):
+
+class CrossReferenceView(APIView):
+    """
+    GET /api/identity-checker/cross-reference/?application=iprotect
+    GET /api/identity-checker/cross-reference/?application=iprotect&view=summary
+    GET /api/identity-checker/cross-reference/?application=iprotect&category=only_in_ad_group&search=jan&cursor=...
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        application = request.query_params.get("application")
+        category = request.query_params.get("category")
+
+        if not application or application not in Application.values:
             return Response(
-                {"error": "Could not find a username/user/login column in the file"},
+                {"error": f"Invalid application. Choose from: {Application.values}"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Replace existing data
-        Identity.objects.filter(application=application, source=source).delete()
-
-        created = 0
-        skipped = 0
-        for row in rows:
-            username = row.get("username", "").strip()
-            if not username:
-                skipped += 1
-                continue
-            try:
-                Identity.objects.create(
-                    application=application,
-                    source=source,
-                    username=username,
-                    email=row.get("email"),
-                    display_name=row.get("display_name"),
-                    department=row.get("department"),
-                    extra_data=row.get("extra_data", {}),
+        etag = make_etag(request, get_generation(application))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        if request.query_params.get("view") == "summary":
+            return set_etag(Response({"summary": cross_reference_summary(application)}), etag)
+
+        if category:
+            if category not in CATEGORY_MASKS:
+                return Response(
+                    {"error": f"Invalid category. Choose from: {list(CATEGORY_MASKS)}"},
+                    status=status.HTTP_400_BAD_REQUEST,
                 )
-                created += 1
-            except IntegrityError:
-                skipped += 1
-
-        UploadLog.objects.create(
-            application=application,
-            source=source,
-            filename=filename,
-            row_count=created,
-            status="success",
-        )
+            qs = category_keys(application, category)
+            search = request.query_params.get("search", "").strip().lower()
+            if search:
+                qs = qs.filter(key__contains=search)
 
-        return Response({
-            "application": application,
-            "source": source,
-            "filename": filename,
-            "created": created,
-            "skipped": skipped,
-        }, status=status.HTTP_201_CREATED)
+            paginator = CrossReferenceCursorPagination()
+            page = paginator.paginate_queryset(qs, request, view=self)
+            return set_etag(paginator.get_paginated_response(entries_for_keys(application, page)), etag)
 
+        body = cached_cross_reference(application)
+        if request.accepted_renderer.format != "json":
+            # Columnar/MessagePack: re-render the cached result in the negotiated format
+            return set_etag(Response(json.loads(body)), etag)
+        return set_etag(HttpResponse(body, content_type="application/json"), etag)
 
-class CrossReferenceView(APIView):
+
+class CrossReferenceExportView(APIView):
     """
-    GET /api/identity-checker/cross-reference/?application=iprotect
+    GET /api/identity-checker/cross-reference/export/csv/?application=iprotect
+    GET /api/identity-checker/cross-reference/export/ndjson/?application=iprotect&category=only_in_ad_group
     """
+    permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+    fields = [
+        "category", "username", "email", "display_name", "department",
+        "in_users", "in_mail_dist", "in_ad_group",
+    ]
+
+    def get(self, request, export_format):
         application = request.query_params.get("application")
+        category = request.query_params.get("category")
 
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"Invalid format. Choose from: {list(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         if not application or application not in Application.values:
             return Response(
                 {"error": f"Invalid application. Choose from: {Application.values}"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if category and category not in CATEGORY_MASKS:
+            return Response(
+                {"error": f"Invalid category. Choose from: {list(CATEGORY_MASKS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        result = cross_reference(application)
-        return Response(result)
+        rows = iter_members(application, category or None, chunk_size=EXPORT_CHUNK_SIZE)
+        filename = "_".join(["cross_reference", application] + ([category] if category else []))
+        return export_response(rows, self.fields, export_format, filename)
 
 
 class UploadLogView(APIView):
     """
     GET /api/identity-checker/upload-logs/?application=iprotect
     """
+    permission_classes = [IsAuthenticated]
 
     def get(self, request):
         application = request.query_params.get("application")
@@ -177,19 +372,74 @@ class UploadLogView(APIView):
         return Response(serializer.data)
 
 
+class SnapshotListView(APIView):
+    """
+    GET /api/identity-checker/snapshots/?application=iprotect&source=ad_group
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        application = request.query_params.get("application")
+        source = request.query_params.get("source")
+        qs = IdentitySnapshot.objects.select_related("upload_log").defer("usernames", "hashes")
+        if application:
+            qs = qs.filter(application=application)
+        if source:
+            qs = qs.filter(source=source)
+        serializer = IdentitySnapshotSerializer(qs[:50], many=True)
+        return Response(serializer.data)
+
+
+class SnapshotDiffView(APIView):
+    """
+    GET /api/identity-checker/snapshots/diff/?from=12&to=15
+    Usernames added, removed and changed between two snapshots of the same application+source.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            old = IdentitySnapshot.objects.get(pk=request.query_params.get("from"))
+            new = IdentitySnapshot.objects.get(pk=request.query_params.get("to"))
+        except (IdentitySnapshot.DoesNotExist, ValueError):
+            return Response(
+                {"error": "from and to must be existing snapshot ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if (old.application, old.source) != (new.application, new.source):
+            return Response(
+                {"error": "Snapshots belong to different application/source combinations"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response({
+            "application": new.application,
+            "source": new.source,
+            "from": IdentitySnapshotSerializer(old).data,
+            "to": IdentitySnapshotSerializer(new).data,
+            **diff_snapshots(old, new),
+        })
+
+
 class StatusView(APIView):
     """
     GET /api/identity-checker/status/
     Returns which application+source combinations have data loaded.
+    Set IDENTITY_CHECKER_CACHE_STATUS = True to serve the counts from the cache.
     """
+    permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        result = {}
-        for app in Application.values:
-            result[app] = {}
-            for src in IdentitySource.values:
-                count = Identity.objects.filter(application=app, source=src).count()
-                result[app][src] = count
-
-        return Response(result)
+        etag = make_etag(request, sorted(get_generations().items()))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        if getattr(settings, "IDENTITY_CHECKER_CACHE_STATUS", False):
+            result = cached_identity_counts()
+        else:
+            result = identity_counts()
+
+        return set_etag(Response(result), etag)
 